@@ -2,6 +2,8 @@
 ASGI config for HabitTracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the project through it (e.g. ``uvicorn HabitTracker.asgi:application``)
+to enable the notification stream at /api/notifications/stream/.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
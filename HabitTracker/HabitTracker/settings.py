@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -62,6 +63,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'habit.context_processors.unread_notifications',
             ],
         },
     },
@@ -87,6 +89,16 @@ DATABASES = {
     }
 }
 
+# HABIT_DATABASE=sqlite runs against a local file instead, e.g. for the
+# benchmark suite in habit/tests.py on a machine without MySQL
+if os.environ.get('HABIT_DATABASE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
 AUTH_USER_MODEL = 'habit.User'
 
 
@@ -119,6 +131,55 @@ USE_I18N = True
 USE_TZ = False
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; point this at a shared backend (file based,
+# memcached, redis) when running more than one worker process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'habit-tracker',
+    }
+}
+
+# Seconds a user's dashboard stays cached; signals invalidate it on writes.
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Days read notifications are kept before purge_notifications archives them.
+NOTIFICATION_RETENTION_DAYS = 30
+
+# Points awarded for each completed habit log (see habit.rewards).
+POINTS_PER_COMPLETION = 10
+
+# Sorted-set store behind habit.leaderboard. The default lives in process
+# memory, like the cache above; any client with Redis' zadd/zrevrank/
+# zrevrange/zrem/exists/delete commands can be plugged in instead.
+LEADERBOARD_STORE = 'habit.leaderboard.LocalSortedSets'
+
+# Users whose friend ids habit.social keeps in process memory; 0 disables it.
+# Per process like the cache above, so only raise it with a single worker.
+FRIEND_GRAPH_CACHE_SIZE = 0
+
+# Activity feed (habit.activity): users with more friends than the fan-out
+# limit are read on demand instead of being copied to every timeline, and
+# trim_timelines keeps each timeline to the newest FEED_TIMELINE_SIZE events.
+FEED_FANOUT_LIMIT = 1000
+FEED_TIMELINE_SIZE = 500
+STREAK_MILESTONES = (7, 30, 100, 365)
+
+# Threads per process running deferred work (habit.background): derived
+# updates of one-tap logging and notification fan-out. 0 runs it inline
+# right after the commit.
+BACKGROUND_WORKERS = 4
+
+# Broker behind the notification stream (habit.events). The default goes
+# through the database so events from every process and management command
+# reach the streams; habit.events.InProcessBroker skips the table when one
+# process serves the streams and nothing else creates notifications.
+NOTIFICATION_BROKER = 'habit.events.DatabaseBroker'
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
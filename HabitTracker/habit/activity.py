@@ -0,0 +1,249 @@
+"""
+Friend activity feed.
+
+Completed logs, streak milestones and badge awards are recorded once as an
+``ActivityEvent`` and then copied (fanned out) to a ``TimelineEntry`` row for
+every friend of the user, in batches on the background pool (background.py)
+once the write commits. Reading a feed
+is then a range scan of the reader's (owner, event) index instead of a join
+of friendships, logs and habits.
+
+Users with more than ``FEED_FANOUT_LIMIT`` friends skip the copy: their
+events are stored with ``fanned_out=False`` and readers pull them from the
+``ActivityEvent`` table directly (fan-out on read).
+
+Timelines are capped at ``FEED_TIMELINE_SIZE`` entries per user by trim(),
+run periodically through the ``trim_timelines`` command, which then has
+prune_events() delete the events no timeline references any more and the
+pulled events beyond the newest ``FEED_TIMELINE_SIZE`` of each user.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils.timezone import now
+
+from . import background, social
+from .models import ActivityEvent, TimelineEntry, today_date
+
+# Timeline rows inserted per query while fanning out.
+FANOUT_BATCH = 500
+
+# Events a new friendship copies into each side's timeline.
+BACKFILL_EVENTS = 20
+
+PAGE_SIZE = 20
+
+# Age before an event nobody's timeline holds counts as unreferenced, leaving
+# its deferred fan-out time to run.
+PRUNE_GRACE = datetime.timedelta(hours=1)
+
+# Events deleted per query while pruning.
+PRUNE_BATCH = 1000
+
+
+def fanout_limit():
+    return getattr(settings, "FEED_FANOUT_LIMIT", 1000)
+
+
+def timeline_size():
+    return getattr(settings, "FEED_TIMELINE_SIZE", 500)
+
+
+def streak_milestones():
+    return sorted(getattr(settings, "STREAK_MILESTONES", (7, 30, 100, 365)))
+
+
+# -----------------------------
+# Writing
+# -----------------------------
+def record(user_id, kind, day, habit_id=None, badge_id=None, value=0):
+    """
+    Store one event and, unless the user has too many friends, have the
+    background pool copy it to their friends' timelines once the surrounding
+    transaction commits.
+    """
+    friends = social.neighbors(user_id)
+    event = ActivityEvent.objects.create(
+        user_id=user_id, kind=kind, date=day, habit_id=habit_id, badge_id=badge_id, value=value,
+        fanned_out=len(friends) <= fanout_limit(),
+    )
+    if event.fanned_out and friends:
+        background.defer(fan_out, [event.pk], friends)
+    return event
+
+
+def fan_out(event_ids, owner_ids, batch_size=FANOUT_BATCH):
+    # Runs after the commit: skip events deleted again before it (e.g. a
+    # log completed and then un-completed in the same transaction)
+    event_ids = list(ActivityEvent.objects.filter(id__in=event_ids).values_list("id", flat=True))
+    entries = [TimelineEntry(owner_id=owner_id, event_id=event_id) for owner_id in sorted(owner_ids) for event_id in event_ids]
+    for i in range(0, len(entries), batch_size):
+        TimelineEntry.objects.bulk_create(entries[i:i + batch_size], ignore_conflicts=True)
+
+
+def _completion(habit_id, day):
+    return ActivityEvent.objects.filter(kind="completion", habit_id=habit_id, date=day)
+
+
+def _completions(pairs):
+    days = Q()
+    for habit_id, day in pairs:
+        days |= Q(habit_id=habit_id, date=day)
+    return ActivityEvent.objects.filter(days, kind="completion")
+
+
+def log_saved(log, old_date, was_completed):
+    """
+    Record a completion when a log becomes completed and drop it again when
+    the log is un-completed or moved to another day.
+    """
+    moved = old_date is not None and old_date != log.date
+    if was_completed and (moved or not log.completed):
+        _completion(log.habit_id, old_date).delete()
+    if log.completed and (moved or not was_completed):
+        record(log.habit.user_id, "completion", log.date, habit_id=log.habit_id)
+
+
+def log_deleted(log, was_completed):
+    if was_completed:
+        _completion(log.habit_id, log.date).delete()
+
+
+def completions_changed(user_id, added, removed):
+    """
+    Batch counterpart of log_saved() for writes that skip the signals.
+    ``added`` and ``removed`` are (habit_id, date) pairs whose log became
+    completed or stopped being completed.
+    """
+    if removed:
+        _completions(removed).delete()
+    if not added:
+        return
+    friends = social.neighbors(user_id)
+    fanned_out = len(friends) <= fanout_limit()
+    events = ActivityEvent.objects.bulk_create([
+        ActivityEvent(user_id=user_id, kind="completion", habit_id=habit_id, date=day, fanned_out=fanned_out)
+        for habit_id, day in added
+    ])
+    if fanned_out and friends:
+        event_ids = [event.pk for event in events]
+        if None in event_ids:
+            # MySQL doesn't return the ids of bulk inserted rows
+            event_ids = list(_completions(added).values_list("id", flat=True))
+        background.defer(fan_out, event_ids, friends)
+
+
+def streak_saved(streak, old_current):
+    """
+    Record the highest milestone a streak went past on this save. Dropping
+    below a milestone and reaching it again on the same day records nothing.
+    """
+    crossed = [m for m in streak_milestones() if old_current < m <= streak.current_streak]
+    if not crossed:
+        return
+    day = streak.last_completed or today_date()
+    milestone = ActivityEvent.objects.filter(kind="streak", habit_id=streak.habit_id, date=day, value=crossed[-1])
+    if not milestone.exists():
+        record(streak.user_id, "streak", day, habit_id=streak.habit_id, value=crossed[-1])
+
+
+def badges_awarded(user_id, badge_ids):
+    day = today_date()
+    for badge_id in badge_ids:
+        record(user_id, "badge", day, badge_id=badge_id)
+
+
+def friendship_added(a, b):
+    """
+    Give each side the other's most recent events so a new friend's feed
+    doesn't start empty.
+    """
+    for owner_id, author_id in ((a, b), (b, a)):
+        recent = (
+            ActivityEvent.objects.filter(user_id=author_id, fanned_out=True)
+            .order_by("-id").values_list("id", flat=True)[:BACKFILL_EVENTS]
+        )
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, event_id=event_id) for event_id in recent],
+            ignore_conflicts=True,
+        )
+
+
+def friendship_removed(a, b):
+    TimelineEntry.objects.filter(owner_id=a, event__user_id=b).delete()
+    TimelineEntry.objects.filter(owner_id=b, event__user_id=a).delete()
+
+
+def trim(size=None, on_owner=None):
+    """
+    Delete timeline entries beyond the newest ``size`` of every owner.
+    Returns the number of entries deleted.
+    """
+    size = size or timeline_size()
+    owners = (
+        TimelineEntry.objects.order_by().values("owner_id")
+        .annotate(entries=Count("id")).filter(entries__gt=size)
+        .values_list("owner_id", flat=True)
+    )
+    deleted = 0
+    for owner_id in list(owners):
+        entries = TimelineEntry.objects.filter(owner_id=owner_id)
+        oldest_kept = entries.order_by("-event_id").values_list("event_id", flat=True)[size - 1]
+        removed, _ = entries.filter(event_id__lt=oldest_kept).delete()
+        deleted += removed
+        if on_owner:
+            on_owner(owner_id, removed)
+    return deleted
+
+
+def prune_events(size=None):
+    """
+    Delete fanned-out events older than PRUNE_GRACE that no timeline
+    references, and pulled events beyond the newest ``size`` of each user.
+    Returns the number of events deleted.
+    """
+    size = size or timeline_size()
+    unreferenced = ActivityEvent.objects.filter(fanned_out=True, created_at__lt=now() - PRUNE_GRACE).exclude(
+        Exists(TimelineEntry.objects.filter(event_id=OuterRef("pk")))
+    )
+    deleted, last_id = 0, 0
+    # Ids are read before deleting: MySQL can't delete from a table that the
+    # same statement's subquery reads
+    while ids := list(unreferenced.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:PRUNE_BATCH]):
+        deleted += ActivityEvent.objects.filter(id__in=ids).delete()[1].get(ActivityEvent._meta.label, 0)
+        last_id = ids[-1]
+
+    pulled = ActivityEvent.objects.filter(fanned_out=False)
+    authors = (
+        pulled.order_by().values("user_id")
+        .annotate(events=Count("id")).filter(events__gt=size)
+        .values_list("user_id", flat=True)
+    )
+    for user_id in list(authors):
+        events = pulled.filter(user_id=user_id)
+        oldest_kept = events.order_by("-id").values_list("id", flat=True)[size - 1]
+        deleted += events.filter(id__lt=oldest_kept).delete()[1].get(ActivityEvent._meta.label, 0)
+    return deleted
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def feed(user_id, before=None, size=PAGE_SIZE):
+    """
+    Return (events, next_before): the ``size`` newest events of the user's
+    friends with an id below ``before``, and the cursor for the next page
+    (None on the last page).
+    """
+    entries = TimelineEntry.objects.filter(owner_id=user_id)
+    pulled = ActivityEvent.objects.filter(user_id__in=social.neighbors(user_id), fanned_out=False)
+    if before is not None:
+        entries, pulled = entries.filter(event_id__lt=before), pulled.filter(id__lt=before)
+    ids = list(entries.order_by("-event_id").values_list("event_id", flat=True)[:size])
+    ids += pulled.order_by("-id").values_list("id", flat=True)[:size]
+    ids = sorted(set(ids), reverse=True)[:size]
+
+    events = ActivityEvent.objects.filter(id__in=ids).select_related("user", "habit", "badge")
+    events = sorted(events, key=lambda event: event.pk, reverse=True)
+    return events, (ids[-1] if len(ids) == size else None)
@@ -241,7 +241,7 @@ class UserBadgeAdmin(admin.ModelAdmin):
 
 @admin.register(Reminder)
 class ReminderAdmin(admin.ModelAdmin):
-    list_display = ("habit", "time", "message")
+    list_display = ("habit", "time", "timezone", "message")
     list_select_related = ("habit",)
     search_fields = ("habit__name", "message")
 
@@ -280,8 +280,8 @@ class FriendshipAdmin(admin.ModelAdmin):
 
 @admin.register(Challenge)
 class ChallengeAdmin(admin.ModelAdmin):
-    list_display = ("name", "start_date", "end_date", "created_by", "participant_count")
-    list_filter = ("start_date", "end_date")
+    list_display = ("name", "category", "start_date", "end_date", "created_by", "participant_count")
+    list_filter = ("category", "start_date", "end_date")
     search_fields = ("name", "created_by__email")
     list_select_related = ("created_by",)
     filter_horizontal = ("participants",)
@@ -293,7 +293,7 @@ class ChallengeAdmin(admin.ModelAdmin):
 
 @admin.register(ChallengeProgress)
 class ChallengeProgressAdmin(admin.ModelAdmin):
-    list_display = ("challenge", "user", "progress", "completed")
+    list_display = ("challenge", "user", "progress", "completed_days", "completed")
     list_filter = ("completed", "challenge")
     search_fields = ("challenge__name", "user__email")
     list_select_related = ("challenge", "user")
@@ -328,5 +328,39 @@ class RewardAdmin(admin.ModelAdmin):
     mark_as_unclaimed.short_description = "Mark as unclaimed"
 
 
+@admin.register(DailyUserSummary)
+class DailyUserSummaryAdmin(admin.ModelAdmin):
+    list_display = ("user", "date", "habits_completed", "habits_due", "total_progress")
+    list_filter = ("date",)
+    search_fields = ("user__email", "user__username")
+    list_select_related = ("user",)
+    date_hierarchy = "date"
+
+
+@admin.register(RewardClaim)
+class RewardClaimAdmin(admin.ModelAdmin):
+    list_display = ("user", "title", "points_spent", "claimed_at")
+    search_fields = ("user__email", "title")
+    list_select_related = ("user",)
+    readonly_fields = ("user", "reward", "title", "points_spent", "claimed_at")
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ("user", "updated_at")
+    search_fields = ("user__email", "user__username")
+    list_select_related = ("user",)
+    readonly_fields = ("summary", "updated_at")
+
+
+@admin.register(ActivityEvent)
+class ActivityEventAdmin(admin.ModelAdmin):
+    list_display = ("user", "kind", "habit", "badge", "date", "fanned_out", "created_at")
+    list_filter = ("kind", "fanned_out")
+    search_fields = ("user__email", "user__username")
+    list_select_related = ("user", "habit", "badge")
+    readonly_fields = ("created_at",)
+
+
 # Finally register the custom User
 admin.site.register(User, UserAdmin)
\ No newline at end of file
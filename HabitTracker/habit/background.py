@@ -0,0 +1,69 @@
+"""
+Deferred work.
+
+defer() hands a function to a small shared thread pool once the current
+transaction commits, so request handlers return without waiting on fan-out
+or derived updates. ``BACKGROUND_WORKERS`` sizes the pool; with 0 the
+function runs inline right after the commit instead (tests, or deployments
+that would rather not run threads inside the web process).
+
+The pool lives in the process that queued the work: anything still queued
+when the process exits is lost, and the periodic rebuild/reconcile commands
+are what repair the derived tables after that.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def workers():
+    return getattr(settings, "BACKGROUND_WORKERS", 4)
+
+
+def pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix="habit-background")
+    return _executor
+
+
+def shutdown(wait=True):
+    """
+    Wait for queued work and drop the pool; the next defer() starts a new one.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _run(fn, args, kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Deferred %s failed", getattr(fn, "__qualname__", fn))
+    finally:
+        close_old_connections()
+
+
+def defer(fn, *args, **kwargs):
+    """
+    Run ``fn(*args, **kwargs)`` on the background pool after the current
+    transaction commits (right away outside one). Nothing runs if it rolls back.
+    """
+    def submit():
+        if workers() <= 0:
+            fn(*args, **kwargs)
+        else:
+            pool().submit(_run, fn, args, kwargs)
+    transaction.on_commit(submit)
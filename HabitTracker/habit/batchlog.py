@@ -0,0 +1,153 @@
+"""
+Batch log entry.
+
+Backfilling many habits over many days one log at a time costs a
+validation SELECT, an existence check and a round of signal work per log.
+Here a whole batch is validated in memory against the user's habits (one
+query), diffed against the stored logs (one query) and written with a single
+upsert on the (habit, date) unique key.
+
+bulk_create() skips save() and the HabitLog signals, so apply() then runs
+the derived updates once per affected habit or user instead of once per log:
+streaks and heatmaps are rebuilt, the day rollups and challenge progress
+recomputed, points awarded for the net change in completions and the
+activity feed, leaderboards and dashboard cache told.
+"""
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import activity, challenges, heatmap, leaderboard, rewards, rollups, streaks
+from .cache import invalidate_dashboard
+from .models import Habit, HabitLog, Streak, today_date
+
+MAX_ENTRIES = 1000
+
+
+class BatchError(Exception):
+    """
+    Raised by validate(). ``errors`` maps the index of each bad entry to
+    {field: message}.
+    """
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+def validate(user, entries, today=None):
+    """
+    Turn ``entries`` ({"habit": id, "date": "YYYY-MM-DD", "progress": n}
+    dicts) into unsaved ``HabitLog`` objects with ``completed`` and ``status``
+    set as HabitLog.save() would. Raises BatchError listing every bad entry.
+    """
+    if not isinstance(entries, list) or not entries:
+        raise BatchError("Send a non-empty list of entries.")
+    if len(entries) > MAX_ENTRIES:
+        raise BatchError(f"At most {MAX_ENTRIES} entries per batch.")
+
+    today = today or today_date()
+    ids = {entry.get("habit") for entry in entries if isinstance(entry, dict)}
+    habits = Habit.objects.filter(user=user, id__in=[pk for pk in ids if isinstance(pk, int)])
+    habits = {habit.pk: habit for habit in habits.only("id", "user_id", "name", "target_per_day", "frequency", "custom_days", "category_id")}
+
+    logs, errors, seen = [], {}, set()
+    for index, entry in enumerate(entries):
+        problems = {}
+        if not isinstance(entry, dict):
+            errors[index] = {"entry": "Expected an object."}
+            continue
+        habit = habits.get(entry.get("habit"))
+        if habit is None:
+            problems["habit"] = "Unknown habit."
+        try:
+            day = datetime.date.fromisoformat(str(entry.get("date")))
+            if day > today:
+                problems["date"] = "Logs cannot be in the future."
+        except ValueError:
+            day = None
+            problems["date"] = "Use a YYYY-MM-DD date."
+        progress = entry.get("progress")
+        if not isinstance(progress, int) or isinstance(progress, bool) or progress < 0:
+            problems["progress"] = "Progress must be a whole number of at least 0."
+        elif habit is not None and progress > habit.target_per_day:
+            problems["progress"] = f"Progress cannot exceed the daily target of {habit.target_per_day}."
+        if habit is not None and day is not None:
+            if (habit.pk, day) in seen:
+                problems["date"] = "This habit and date appear twice in the batch."
+            seen.add((habit.pk, day))
+        if problems:
+            errors[index] = problems
+            continue
+
+        completed = progress >= habit.target_per_day
+        logs.append(HabitLog(
+            habit=habit, date=day, progress=progress, completed=completed,
+            status="done" if completed else "pending",
+        ))
+    if errors:
+        raise BatchError("Invalid log entries.", errors)
+    return logs
+
+
+def _stored(logs):
+    """
+    Map (habit_id, date) -> (completed, progress) for the stored rows of ``logs``.
+    """
+    pairs = Q()
+    for log in logs:
+        pairs |= Q(habit_id=log.habit_id, date=log.date)
+    rows = HabitLog.objects.filter(pairs).values_list("habit_id", "date", "completed", "progress")
+    return {(habit_id, day): (completed, progress) for habit_id, day, completed, progress in rows}
+
+
+def apply(user, logs):
+    """
+    Upsert validated ``logs`` of ``user`` and bring everything derived from
+    them up to date. Returns {"created": n, "updated": n, "unchanged": n}.
+    """
+    with transaction.atomic():
+        stored = _stored(logs)
+        changed = [log for log in logs if stored.get((log.habit_id, log.date)) != (log.completed, log.progress)]
+        if changed:
+            # MySQL's ON DUPLICATE KEY UPDATE can't name the conflicting key
+            unique_fields = ["habit", "date"] if connection.features.supports_update_conflicts_with_target else None
+            HabitLog.objects.bulk_create(
+                changed, update_conflicts=True, unique_fields=unique_fields,
+                update_fields=["progress", "completed", "status"],
+            )
+            _derived(user.pk, changed, stored)
+
+    created = sum(1 for log in changed if (log.habit_id, log.date) not in stored)
+    return {"created": created, "updated": len(changed) - created, "unchanged": len(logs) - len(changed)}
+
+
+def _derived(user_id, logs, stored):
+    added, removed = [], []
+    for log in logs:
+        was_completed = stored.get((log.habit_id, log.date), (False, 0))[0]
+        if log.completed and not was_completed:
+            added.append(log)
+        elif was_completed and not log.completed:
+            removed.append(log)
+    flipped = added + removed
+
+    rollups.rebuild([user_id], since=min(log.date for log in logs), until=max(log.date for log in logs))
+    if flipped:
+        habits = {log.habit_id: log.habit for log in flipped}
+        before = dict(Streak.objects.filter(habit_id__in=habits).order_by("-pk").values_list("habit_id", "current_streak"))
+        streaks.rebuild(habits)
+        # Oldest row wins, as in streaks.rebuild()
+        after = {streak.habit_id: streak for streak in Streak.objects.filter(habit_id__in=habits).order_by("-pk")}
+        for habit_id, streak in after.items():
+            activity.streak_saved(streak, before.get(habit_id, 0))
+        for habit_id, habit in habits.items():
+            heatmap.rebuild(habit, {log.date.year for log in flipped if log.habit_id == habit_id})
+        challenges.recompute_user(user_id)
+        if len(added) != len(removed):
+            rewards.award(user_id, rewards.points_per_completion() * (len(added) - len(removed)))
+        activity.completions_changed(
+            user_id, [(log.habit_id, log.date) for log in added], [(log.habit_id, log.date) for log in removed],
+        )
+        leaderboard.score_changed(user_id, "streak")
+    invalidate_dashboard(user_id)
@@ -0,0 +1,69 @@
+"""
+Per-user caches.
+
+Every cached dashboard key embeds a per-user version number. Writes that can
+change what the dashboard shows bump the version (see signals.py), which
+orphans the old entries instead of having to find and delete them.
+
+The unread notification count is a plain per-user counter, filled from the
+database once and then moved by adjust_unread() on every change, so reading
+it never touches the ``Notification`` table.
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import Notification
+
+
+def _version_key(user_id):
+    return f"habit:dashboard:version:{user_id}"
+
+
+def dashboard_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Start from the clock so an evicted counter never reuses old keys
+        cache.add(_version_key(user_id), time.time_ns(), None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def invalidate_dashboard(*user_ids):
+    for user_id in user_ids:
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:
+            cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def dashboard_key(user_id, today):
+    return f"habit:dashboard:{user_id}:{dashboard_version(user_id)}:{today.isoformat()}"
+
+
+
+def _unread_key(user_id):
+    return f"habit:notifications:unread:{user_id}"
+
+
+def unread_count(user_id):
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        # add() so a counter filled concurrently is never overwritten
+        cache.add(_unread_key(user_id), count, None)
+        count = cache.get(_unread_key(user_id), count)
+    return max(count, 0)
+
+
+def adjust_unread(user_id, delta):
+    """
+    Move a user's cached unread count by ``delta``. A missing counter is left
+    alone; the next unread_count() fills it from the database.
+    """
+    if not delta:
+        return
+    try:
+        cache.incr(_unread_key(user_id), delta)
+    except ValueError:
+        pass
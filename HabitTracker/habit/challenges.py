@@ -0,0 +1,150 @@
+"""
+Challenge progress engine.
+
+A participant's progress is the share of the challenge's days, from
+``start_date`` to ``end_date``, on which they completed at least one linked
+habit: any of their habits, or only those in the challenge's category.
+
+Log writes adjust ``ChallengeProgress.completed_days`` for the one day they
+touch. recompute() rebuilds a whole challenge with one grouped query per
+chunk of participants and is used when participants or rules change.
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+
+from . import leaderboard
+from .models import Challenge, ChallengeProgress, HabitLog
+
+BATCH_SIZE = 1000
+
+
+def percentage(completed_days, total_days):
+    return min(100, completed_days * 100 // total_days)
+
+
+def _set_days(row, completed_days, total_days):
+    row.completed_days = completed_days
+    row.progress = percentage(completed_days, total_days)
+    row.completed = row.progress >= 100
+
+
+def _linked_logs(user_ids, category_id):
+    logs = HabitLog.objects.filter(habit__user_id__in=user_ids, completed=True)
+    if category_id is not None:
+        logs = logs.filter(habit__category_id=category_id)
+    return logs
+
+
+# -----------------------------
+# Log-driven updates
+# -----------------------------
+def log_saved(log, old_date, was_completed):
+    moved = old_date is not None and old_date != log.date
+    if was_completed and (moved or not log.completed):
+        _day_changed(log.habit, old_date, -1)
+    if log.completed and (moved or not was_completed):
+        _day_changed(log.habit, log.date, +1)
+
+
+def log_deleted(log, was_completed):
+    if was_completed:
+        _day_changed(log.habit, log.date, -1)
+
+
+def _day_changed(habit, day, delta):
+    """
+    A completed log of ``habit`` on ``day`` was added (+1) or removed (-1).
+    The day only counts once per challenge, so it moves ``completed_days``
+    only when it was the day's first or last linked completion.
+    """
+    with transaction.atomic():
+        rows = list(
+            ChallengeProgress.objects.select_for_update()
+            .filter(user_id=habit.user_id, challenge__start_date__lte=day, challenge__end_date__gte=day)
+            .filter(Q(challenge__category__isnull=True) | Q(challenge__category_id=habit.category_id))
+            .select_related("challenge")
+        )
+        changed = []
+        for category_id in {row.challenge.category_id for row in rows}:
+            remaining = _linked_logs([habit.user_id], category_id).filter(date=day).count()
+            if remaining != (1 if delta > 0 else 0):
+                continue
+            for row in rows:
+                if row.challenge.category_id == category_id:
+                    _set_days(row, max(row.completed_days + delta, 0), row.challenge.total_days())
+                    changed.append(row)
+        ChallengeProgress.objects.bulk_update(changed, ["completed_days", "progress", "completed"])
+    # bulk_update skips the signals that move the leaderboards
+    for row in changed:
+        leaderboard.progress_changed(row.challenge_id, row.user_id, row.progress)
+
+
+# -----------------------------
+# Batch recompute
+# -----------------------------
+def recompute(challenge, user_ids=None, batch_size=BATCH_SIZE):
+    """
+    Recompute progress for the participants of ``challenge`` (or just
+    ``user_ids``) in chunks, creating missing rows and dropping rows of users
+    who left. Returns the number of participants processed.
+    """
+    participants = challenge.participants.order_by("id").values_list("id", flat=True)
+    if user_ids is not None:
+        participants = participants.filter(id__in=user_ids)
+    participants = list(participants)
+    total_days = challenge.total_days()
+
+    stale = ChallengeProgress.objects.filter(challenge=challenge).exclude(user_id__in=challenge.participants.all())
+    if user_ids is not None:
+        stale = stale.filter(user_id__in=user_ids)
+    stale.delete()
+
+    for i in range(0, len(participants), batch_size):
+        chunk = participants[i:i + batch_size]
+        days = dict(
+            _linked_logs(chunk, challenge.category_id)
+            .filter(date__range=(challenge.start_date, challenge.end_date))
+            .order_by().values("habit__user_id")
+            .annotate(days=Count("date", distinct=True))
+            .values_list("habit__user_id", "days")
+        )
+        with transaction.atomic():
+            existing = {
+                row.user_id: row
+                for row in ChallengeProgress.objects.select_for_update().filter(challenge=challenge, user_id__in=chunk)
+            }
+            new = []
+            for user_id in chunk:
+                row = existing.get(user_id)
+                if row is None:
+                    row = ChallengeProgress(challenge=challenge, user_id=user_id)
+                    new.append(row)
+                _set_days(row, days.get(user_id, 0), total_days)
+            ChallengeProgress.objects.bulk_update(existing.values(), ["completed_days", "progress", "completed"])
+            ChallengeProgress.objects.bulk_create(new, ignore_conflicts=True)
+
+    # Rebuilt on the next read
+    leaderboard.get_store().delete(leaderboard.challenge_key(challenge.pk))
+    return len(participants)
+
+
+def recompute_user(user_id, category_ids=None, since=None, until=None):
+    """
+    Recompute the challenges ``user_id`` takes part in, e.g. after one of
+    their habits was deleted or moved to another category. ``category_ids``
+    limits this to challenges of those categories (None standing for the
+    ones that count every habit), ``since``/``until`` to challenges
+    overlapping those dates.
+    """
+    challenges = Challenge.objects.filter(participants__id=user_id)
+    if category_ids is not None:
+        linked = Q(category_id__in=[pk for pk in category_ids if pk is not None])
+        if None in category_ids:
+            linked |= Q(category__isnull=True)
+        challenges = challenges.filter(linked)
+    if since:
+        challenges = challenges.filter(end_date__gte=since)
+    if until:
+        challenges = challenges.filter(start_date__lte=until)
+    for challenge in challenges:
+        recompute(challenge, user_ids=[user_id])
@@ -0,0 +1,10 @@
+from .cache import unread_count
+
+
+def unread_notifications(request):
+    """
+    Expose the cached unread notification count to every template (base.html).
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications_count': unread_count(request.user.pk)}
@@ -0,0 +1,72 @@
+"""
+Dashboard data service.
+
+Builds everything the dashboard template needs in a fixed number of queries,
+however many habits and logs the user has:
+
+1. one conditional aggregate over the user's habits for the stat cards,
+2. the progressing habits,
+3. today's log for each of those habits (one prefetch keyed by habit id),
+4. the five most recent logs for the activity list.
+
+get_cached_dashboard() serves the same context from the per-user cache in
+cache.py, so repeated loads skip these queries entirely.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, Max, OuterRef, Prefetch, Q
+
+from .cache import dashboard_key
+from .models import Habit, HabitLog, today_date
+from .streaks import alive_q
+
+
+def get_dashboard(user, today=None):
+    today = today or today_date()
+    done_today = HabitLog.objects.filter(habit=OuterRef('pk'), date=today, completed=True)
+    alive = Q(streaks__is_active=True) & alive_q(today, frequency='frequency', last_completed='streaks__last_completed')
+
+    stats = Habit.objects.filter(user=user).aggregate(
+        total_habits=Count('id', distinct=True),
+        active_habits_count=Count('id', distinct=True, filter=Q(status='progressing')),
+        completed_habits_today=Count('id', distinct=True, filter=Exists(done_today)),
+        active_streaks=Count('streaks', distinct=True, filter=alive),
+        current_streak=Max('streaks__current_streak', filter=alive),
+    )
+
+    habits = list(
+        Habit.objects.filter(user=user, status='progressing')
+        .select_related('unit')
+        .prefetch_related(Prefetch('logs', queryset=HabitLog.objects.filter(date=today), to_attr='today_logs'))
+        .order_by('created_at')
+    )
+    for habit in habits:
+        habit.today_log = habit.today_logs[0] if habit.today_logs else None
+        habit.completed_today = bool(habit.today_log and habit.today_log.completed)
+
+    recent_logs = HabitLog.objects.filter(habit__user=user).select_related('habit').order_by('-date', '-id')[:5]
+
+    return {
+        **stats,
+        'current_streak': stats['current_streak'] or 0,
+        'habits': habits,
+        'total_points': user.points,
+        'recent_logs': list(recent_logs),
+        'today': today,
+    }
+
+
+def get_cached_dashboard(user, today):
+    """
+    Return the dashboard context for ``user``, computing it only when the
+    user's cached copy is missing or has been invalidated.
+    """
+    key = dashboard_key(user.pk, today)
+    context = cache.get(key)
+    if context is None:
+        context = get_dashboard(user, today)
+        cache.set(key, context, settings.DASHBOARD_CACHE_TIMEOUT)
+    # Lets the template cache its rendered fragment under the same version
+    context['dashboard_cache_key'] = key
+    context['dashboard_cache_timeout'] = settings.DASHBOARD_CACHE_TIMEOUT
+    return context
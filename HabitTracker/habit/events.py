@@ -0,0 +1,220 @@
+"""
+Notification event fan-out.
+
+Connected clients hold one Server-Sent Events stream each (see
+notification_stream in views.py, served through asgi.py). Writes publish
+small events per user through a broker:
+
+- ``notification``: a new ``Notification`` (id and message),
+- ``unread``: the user's new unread count.
+
+``NOTIFICATION_BROKER`` picks the broker. ``DatabaseBroker`` (the default)
+carries events between processes through the ``StreamEvent`` table, so
+reminders and other management commands reach the streams too;
+``InProcessBroker`` only delivers to streams open in the publishing process.
+Any class with the same four methods can be plugged in. Events are published
+only after the writing transaction commits, and ``unread`` events get their
+count from the process serving the stream.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache import unread_count
+from .models import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream.
+KEEPALIVE = 15
+
+# Events buffered per stream before a slow client starts missing them.
+QUEUE_SIZE = 100
+
+# DatabaseBroker: seconds between reads of new events while streams are
+# open, and seconds an event row is kept.
+POLL_INTERVAL = 1
+EVENT_TTL = 300
+
+
+class InProcessBroker:
+    """
+    Per-user publish/subscribe between the threads and event loops of one
+    process. Publishing to a user nobody is listening to is a dict lookup.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscribers.pop(user_id, None)
+
+    def has_subscribers(self, user_id):
+        return user_id in self._subscribers
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscriptions:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        pass  # The next unread event resyncs the badge
+
+
+class DatabaseBroker(InProcessBroker):
+    """
+    Cross-process broker on the ``StreamEvent`` table. publish() inserts one
+    row for any process to pick up. Each process runs one poller thread that,
+    while it has streams open, reads the new rows of their users every
+    POLL_INTERVAL seconds and hands them to the local subscribers; it also
+    prunes rows older than EVENT_TTL, as does purge_notifications.
+    """
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name="habit-stream-poller", daemon=True)
+                self._poller.start()
+        return subscription
+
+    def has_subscribers(self, user_id):
+        return True  # Streams may be open in any process
+
+    def publish(self, user_id, event):
+        StreamEvent.objects.create(user_id=user_id, payload=event)
+
+    def close(self):
+        self._stopped.set()
+        if self._poller is not None:
+            self._poller.join()
+
+    def _poll(self):
+        try:
+            last_id = StreamEvent.objects.aggregate(last=Max("id"))["last"] or 0
+            pruned = timezone.now()
+            while not self._stopped.wait(POLL_INTERVAL):
+                try:
+                    with self._lock:
+                        user_ids = list(self._subscribers)
+                    if user_ids:
+                        rows = StreamEvent.objects.filter(id__gt=last_id, user_id__in=user_ids).order_by("id")
+                        for pk, user_id, payload in rows.values_list("id", "user_id", "payload"):
+                            super().publish(user_id, payload)
+                            last_id = pk
+                    if timezone.now() - pruned > datetime.timedelta(seconds=EVENT_TTL):
+                        prune()
+                        pruned = timezone.now()
+                except Exception:
+                    logger.exception("Reading stream events failed")
+                    connection.close()
+        finally:
+            connection.close()
+
+
+def prune():
+    """
+    Delete stream events older than EVENT_TTL; returns how many.
+    """
+    before = timezone.now() - datetime.timedelta(seconds=EVENT_TTL)
+    return StreamEvent.objects.filter(created_at__lt=before).delete()[0]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, "NOTIFICATION_BROKER", "habit.events.DatabaseBroker")
+            _broker = import_string(path)()
+    return _broker
+
+
+def reset_broker():
+    """
+    Drop the broker (stopping its poller); the next get_broker() makes a new one.
+    """
+    global _broker
+    with _broker_lock:
+        broker, _broker = _broker, None
+    if hasattr(broker, "close"):
+        broker.close()
+
+
+# -----------------------------
+# Publishing
+# -----------------------------
+def notification_created(notification):
+    user_id, event = notification.user_id, {
+        "type": "notification", "id": notification.pk, "message": notification.message,
+    }
+    transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+
+def unread_changed(user_id):
+    def publish():
+        broker = get_broker()
+        if broker.has_subscribers(user_id):
+            broker.publish(user_id, {"type": "unread"})
+    transaction.on_commit(publish)
+
+
+# -----------------------------
+# Streaming
+# -----------------------------
+def _format(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(user_id):
+    """
+    Async iterator of SSE frames for one client, starting with the current
+    unread count. Unsubscribes when the client disconnects.
+    """
+    broker = get_broker()
+    subscription = broker.subscribe(user_id)
+    queue = subscription[1]
+    try:
+        yield _format({"type": "unread", "count": await sync_to_async(unread_count)(user_id)})
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event["type"] == "unread":
+                event = {**event, "count": await sync_to_async(unread_count)(user_id)}
+            yield _format(event)
+    finally:
+        broker.unsubscribe(user_id, subscription)
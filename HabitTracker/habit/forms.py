@@ -194,12 +194,45 @@ class HabitLogForm(forms.ModelForm):
         return progress
 
 
+class HabitLogFilterForm(forms.Form):
+    habit = forms.ModelChoiceField(queryset=Habit.objects.none(), required=False, empty_label="All habits",
+                                   widget=forms.Select(attrs={"class": "form-select form-select-sm"}))
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date", "class": "form-control form-control-sm"}))
+    status = forms.ChoiceField(choices=[("", "Any status")] + HabitLog.STATUS_CHOICES, required=False,
+                               widget=forms.Select(attrs={"class": "form-select form-select-sm"}))
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['habit'].queryset = Habit.objects.filter(user=user).only('id', 'name').order_by('name')
+        # Habit.__str__ reads habit.user, one query per option
+        self.fields['habit'].label_from_instance = lambda habit: habit.name
+
+    def filter(self, logs):
+        """
+        Narrow a HabitLog queryset with the valid filters of this form.
+        """
+        if not self.is_valid():
+            return logs
+        data = self.cleaned_data
+        if data['habit']:
+            logs = logs.filter(habit=data['habit'])
+        if data['date_from']:
+            logs = logs.filter(date__gte=data['date_from'])
+        if data['date_to']:
+            logs = logs.filter(date__lte=data['date_to'])
+        if data['status']:
+            logs = logs.filter(status=data['status'])
+        return logs
+
+
 # 🏆 Challenge Form
 class ChallengeForm(forms.ModelForm):
 
     class Meta:
         model = Challenge
-        fields = ["name", "description", "start_date", "end_date"]
+        fields = ["name", "description", "category", "start_date", "end_date"]
         widgets = {
             "name": forms.TextInput(attrs={"class": "form-control", "placeholder": "30-Day Fitness Challenge"}),
             "description": forms.Textarea(attrs={"class": "form-control", "rows": 3}),
@@ -0,0 +1,99 @@
+"""
+Completion heatmap storage.
+
+Each habit keeps one ``HabitYearBitmap`` row per year: 366 bits, one per day
+of the year, set when that day's log is completed. A whole year of a habit's
+calendar is then a single 46 byte read.
+"""
+import base64
+import datetime
+
+from django.db import transaction
+
+from .models import HabitLog, HabitYearBitmap
+
+BITMAP_BYTES = 46  # 366 days rounded up to whole bytes
+
+
+def day_index(day):
+    return day.timetuple().tm_yday - 1
+
+
+def _build(habit, year):
+    bits = bytearray(BITMAP_BYTES)
+    days = HabitLog.objects.filter(habit=habit, date__year=year, completed=True).values_list('date', flat=True)
+    for day in days:
+        index = day_index(day)
+        bits[index // 8] |= 1 << (index % 8)
+    return bytes(bits)
+
+
+def set_day(habit, day, completed):
+    """
+    Set or clear ``day``'s bit for ``habit``, creating the year's row from
+    the logs when it does not exist yet.
+    """
+    index = day_index(day)
+    with transaction.atomic():
+        row = HabitYearBitmap.objects.select_for_update().filter(habit=habit, year=day.year).first()
+        if row is None:
+            # _build() already sees the log being saved
+            HabitYearBitmap.objects.get_or_create(habit=habit, year=day.year, defaults={'completed_days': _build(habit, day.year)})
+            return
+        bits = bytearray(row.completed_days)
+        if completed:
+            bits[index // 8] |= 1 << (index % 8)
+        else:
+            bits[index // 8] &= ~(1 << (index % 8))
+        row.completed_days = bytes(bits)
+        row.save(update_fields=['completed_days'])
+
+
+def log_saved(log, old_date, was_completed):
+    if old_date is not None and old_date != log.date and was_completed:
+        set_day(log.habit, old_date, False)
+    if log.completed != was_completed or (old_date is not None and old_date != log.date):
+        set_day(log.habit, log.date, log.completed)
+
+
+def log_deleted(log, was_completed):
+    if was_completed:
+        set_day(log.habit, log.date, False)
+
+
+def rebuild(habit, years):
+    """
+    Rewrite ``habit``'s bitmaps for ``years`` from its logs, for bulk writes
+    that skip log_saved().
+    """
+    for year in years:
+        HabitYearBitmap.objects.update_or_create(habit=habit, year=year, defaults={'completed_days': _build(habit, year)})
+
+
+def year_bitmap(habit, year):
+    bits = HabitYearBitmap.objects.filter(habit=habit, year=year).values_list('completed_days', flat=True).first()
+    if bits is None:
+        # Years from before the bitmaps existed are built once, on first read
+        bits = _build(habit, year)
+        if any(bits):
+            HabitYearBitmap.objects.get_or_create(habit=habit, year=year, defaults={'completed_days': bits})
+    return bytes(bits)
+
+
+def year_data(habit, year):
+    """
+    Return the JSON payload for one year of ``habit``'s heatmap: the bitmap
+    (base64) plus a dense per-day progress list read as plain tuples.
+    """
+    days = (datetime.date(year + 1, 1, 1) - datetime.date(year, 1, 1)).days
+    progress = [0] * days
+    for day, value in HabitLog.objects.filter(habit=habit, date__year=year).values_list('date', 'progress'):
+        progress[day_index(day)] = value
+    return {
+        'habit': habit.pk,
+        'year': year,
+        'days': days,
+        'target_per_day': habit.target_per_day,
+        'bitmap': base64.b64encode(year_bitmap(habit, year)).decode(),
+        'progress': progress,
+    }
@@ -0,0 +1,326 @@
+"""
+Leaderboards.
+
+Each board is a sorted set of user ids scored by one metric:
+
+- ``leaderboard:challenge:<id>``: ``ChallengeProgress.progress`` of the
+  challenge's participants,
+- ``leaderboard:friends:<user id>:<metric>``: the user and their friends by
+  ``points`` or by best current ``streak``.
+
+Boards are built from the database on first read and then kept current by
+incremental updates from signals.py (or explicit calls where writes bypass
+save()). Top-N and rank reads are O(log n) walks of the sorted entries.
+
+The store speaks the Redis sorted-set commands used below, so a Redis client
+can replace the in-process ``LocalSortedSets`` through ``LEADERBOARD_STORE``.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.module_loading import import_string
+
+from . import social
+from .models import ChallengeProgress, Streak, User
+
+METRICS = ("points", "streak")
+
+
+class _SkipList:
+    """
+    Indexable skip list of comparable keys: insert, remove, rank and the
+    start of a slice are O(log n) expected. Each link records how many
+    entries it skips so ranks come from the same walk as the search.
+    """
+    MAX_LEVEL = 32
+
+    class _Node:
+        __slots__ = ("key", "next", "width")
+
+        def __init__(self, key, level):
+            self.key = key
+            self.next = [None] * level
+            self.width = [1] * level
+
+    def __init__(self):
+        self._tail = self._Node(None, 0)
+        self._head = self._Node(None, self.MAX_LEVEL)
+        self._head.next = [self._tail] * self.MAX_LEVEL
+        self._size = 0
+        # Levels in use; the head's links above them are not kept current
+        self._levels = 1
+
+    def __len__(self):
+        return self._size
+
+    def _path(self, key):
+        # The last node before ``key`` on every level, and its 1-based rank
+        path, ranks = [None] * self._levels, [0] * self._levels
+        node, rank = self._head, 0
+        for level in reversed(range(self._levels)):
+            while node.next[level] is not self._tail and node.next[level].key < key:
+                rank += node.width[level]
+                node = node.next[level]
+            path[level], ranks[level] = node, rank
+        return path, ranks
+
+    def insert(self, key):
+        height = 1
+        while height < self.MAX_LEVEL and random.random() < 0.5:
+            height += 1
+        for level in range(self._levels, height):
+            self._head.width[level] = self._size + 1
+        self._levels = max(self._levels, height)
+        path, ranks = self._path(key)
+        node, rank = self._Node(key, height), ranks[0] + 1
+        for level in range(self._levels):
+            before = path[level]
+            if level < height:
+                node.next[level] = before.next[level]
+                node.width[level] = ranks[level] + before.width[level] + 1 - rank
+                before.next[level] = node
+                before.width[level] = rank - ranks[level]
+            else:
+                before.width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        path, _ = self._path(key)
+        node = path[0].next[0]
+        for level in range(self._levels):
+            before = path[level]
+            if before.next[level] is node:
+                before.width[level] += node.width[level] - 1
+                before.next[level] = node.next[level]
+            else:
+                before.width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key):
+        """
+        Number of keys smaller than ``key``, like ``bisect_left``.
+        """
+        return self._path(key)[1][0]
+
+    def slice(self, start, stop):
+        node, rank = self._head, 0
+        for level in reversed(range(self._levels)):
+            while node.next[level] is not self._tail and rank + node.width[level] <= start:
+                rank += node.width[level]
+                node = node.next[level]
+        keys = []
+        node = node.next[0]
+        while node is not self._tail and len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class LocalSortedSets:
+    """
+    In-process stand-in for Redis sorted sets. Entries are kept in a skip
+    list as (-score, member) so writes and rank lookups are O(log n). Every
+    command, reads included, runs under one lock.
+
+    Each worker process holds its own copy built from the database, and
+    incremental updates reach only the process that made the write, so
+    boards drift between workers until they are rebuilt. Deployments with
+    more than one worker should point ``LEADERBOARD_STORE`` at Redis.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sets = {}
+
+    def _get(self, name):
+        return self._sets.get(name) or (_SkipList(), {})
+
+    def zadd(self, name, mapping):
+        with self._lock:
+            entries, scores = self._sets.setdefault(name, (_SkipList(), {}))
+            for member, score in mapping.items():
+                if member in scores:
+                    entries.remove((-scores[member], member))
+                entries.insert((-score, member))
+                scores[member] = score
+            return len(mapping)
+
+    def zrem(self, name, *members):
+        with self._lock:
+            entries, scores = self._get(name)
+            removed = 0
+            for member in members:
+                if member in scores:
+                    entries.remove((-scores.pop(member), member))
+                    removed += 1
+            return removed
+
+    def zscore(self, name, member):
+        with self._lock:
+            return self._get(name)[1].get(member)
+
+    def zrevrank(self, name, member):
+        with self._lock:
+            entries, scores = self._get(name)
+            if member not in scores:
+                return None
+            return entries.rank((-scores[member], member))
+
+    def zrevrange(self, name, start, end, withscores=False):
+        with self._lock:
+            entries = self._get(name)[0]
+            end = len(entries) + end if end < 0 else end
+            window = entries.slice(start, end + 1)
+        if withscores:
+            return [(member, -score) for score, member in window]
+        return [member for _, member in window]
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self._get(name)[1])
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._get(name)[1])
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._sets.pop(name, None) is not None)
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(getattr(settings, "LEADERBOARD_STORE", "habit.leaderboard.LocalSortedSets"))()
+    return _store
+
+
+def reset_store():
+    """
+    Forget the store so the next get_store() builds a fresh one from the
+    current settings (tests, or after changing ``LEADERBOARD_STORE``).
+    """
+    global _store
+    _store = None
+
+
+def challenge_key(challenge_id):
+    return f"leaderboard:challenge:{challenge_id}"
+
+
+def friends_key(user_id, metric):
+    return f"leaderboard:friends:{user_id}:{metric}"
+
+
+def _friend_ids(user_id):
+    return list(social.neighbors(user_id))
+
+
+def _scores(user_ids, metric):
+    if metric == "points":
+        return dict(User.objects.filter(id__in=user_ids).values_list("id", "points"))
+    best = dict(
+        Streak.objects.filter(user_id__in=user_ids, is_active=True)
+        .values("user_id").annotate(best=Max("current_streak")).values_list("user_id", "best")
+    )
+    return {user_id: best.get(user_id) or 0 for user_id in user_ids}
+
+
+def user_score(user_id, metric):
+    return _scores([user_id], metric).get(user_id, 0)
+
+
+# -----------------------------
+# Building
+# -----------------------------
+def _challenge_board(challenge_id):
+    key, store = challenge_key(challenge_id), get_store()
+    if not store.exists(key):
+        rows = dict(ChallengeProgress.objects.filter(challenge_id=challenge_id).values_list("user_id", "progress"))
+        if rows:
+            store.zadd(key, rows)
+    return key
+
+
+def _friends_board(user_id, metric):
+    if metric not in METRICS:
+        raise ValueError(f"Unknown leaderboard metric {metric!r}")
+    key, store = friends_key(user_id, metric), get_store()
+    if not store.exists(key):
+        store.zadd(key, _scores([user_id, *_friend_ids(user_id)], metric))
+    return key
+
+
+# -----------------------------
+# Reads
+# -----------------------------
+def top(key, n=10):
+    """
+    The first ``n`` (user_id, score) pairs of a board, best first.
+    """
+    return [(int(member), score) for member, score in get_store().zrevrange(key, 0, n - 1, withscores=True)]
+
+
+def rank(key, user_id):
+    """
+    1-based rank of ``user_id`` on a board, or None if not on it.
+    """
+    position = get_store().zrevrank(key, user_id)
+    return None if position is None else position + 1
+
+
+def challenge_top(challenge_id, n=10):
+    return top(_challenge_board(challenge_id), n)
+
+
+def challenge_rank(challenge_id, user_id):
+    return rank(_challenge_board(challenge_id), user_id)
+
+
+def friends_top(user_id, metric="points", n=10):
+    return top(_friends_board(user_id, metric), n)
+
+
+def friends_rank(user_id, metric="points"):
+    return rank(_friends_board(user_id, metric), user_id)
+
+
+# -----------------------------
+# Incremental updates
+# -----------------------------
+def progress_changed(challenge_id, user_id, progress):
+    key, store = challenge_key(challenge_id), get_store()
+    if store.exists(key):
+        store.zadd(key, {user_id: progress})
+
+
+def progress_removed(challenge_id, user_id):
+    get_store().zrem(challenge_key(challenge_id), user_id)
+
+
+def score_changed(user_id, metric, score=None):
+    """
+    Move ``user_id`` on every friends board it appears on that has been
+    built: its own and each friend's.
+    """
+    store = get_store()
+    owners = [user_id, *_friend_ids(user_id)]
+    keys = [friends_key(owner, metric) for owner in owners]
+    built = [key for key in keys if store.exists(key)]
+    if not built:
+        return
+    score = user_score(user_id, metric) if score is None else score
+    for key in built:
+        store.zadd(key, {user_id: score})
+
+
+def friendship_changed(*user_ids):
+    """
+    Drop the friends boards of users whose friend list changed; they are
+    rebuilt on the next read.
+    """
+    get_store().delete(*(friends_key(user_id, metric) for user_id in user_ids for metric in METRICS))
@@ -0,0 +1,35 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from habit import rollups
+from habit.models import User
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailyUserSummary rows from HabitLog history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild this user's summaries (id or email).")
+        parser.add_argument("--since", type=datetime.date.fromisoformat, help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--until", type=datetime.date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD).")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Users aggregated per query and rows per bulk insert.")
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options["user"]:
+            lookup = {"pk": options["user"]} if options["user"].isdigit() else {"email": options["user"]}
+            try:
+                user_ids = [User.objects.get(**lookup).pk]
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+
+        started = time.monotonic()
+        written = rollups.rebuild(
+            user_ids, since=options["since"], until=options["until"], batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} daily summaries in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,37 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from habit import reminders
+
+ONE_MINUTE = datetime.timedelta(minutes=1)
+
+
+class Command(BaseCommand):
+    help = "Send habit reminders as notifications, once per minute."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Dispatch the current minute and exit.")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Reminders read per chunk and notifications per bulk insert.")
+
+    def handle(self, *args, **options):
+        minute = reminders.current_minute()
+        while True:
+            # Every minute is dispatched exactly once, in order, even if a
+            # tick overruns; a single worker must run at a time
+            self.tick(minute, options["batch_size"])
+            if options["once"]:
+                return
+            minute += ONE_MINUTE
+            wait = (minute - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+            if wait > 0:
+                time.sleep(wait)
+
+    def tick(self, minute, batch_size):
+        started = time.monotonic()
+        sent = reminders.dispatch(minute, batch_size=batch_size)
+        self.stdout.write(
+            f"{minute:%Y-%m-%d %H:%M} UTC: sent {sent} reminders in {time.monotonic() - started:.2f}s."
+        )
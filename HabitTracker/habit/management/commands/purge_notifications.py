@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from habit import events, retention
+
+
+class Command(BaseCommand):
+    help = "Archive and delete read notifications older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int,
+                            help="Keep read notifications this many days (default NOTIFICATION_RETENTION_DAYS).")
+        parser.add_argument("--chunk-size", type=int, default=retention.CHUNK_SIZE,
+                            help="Notifications archived and deleted per transaction.")
+
+    def handle(self, *args, **options):
+        before = retention.cutoff(options["days"])
+        started = time.monotonic()
+        totals = {"deleted": 0, "chunks": 0}
+
+        def progress(deleted, users):
+            totals["deleted"] += deleted
+            totals["chunks"] += 1
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"  chunk {totals['chunks']}: {deleted} notifications from {users} users "
+                f"({totals['deleted']} total, {totals['deleted'] / max(elapsed, 1e-9):.0f}/s)"
+            )
+
+        self.stdout.write(f"Purging read notifications created before {before:%Y-%m-%d %H:%M}.")
+        deleted = retention.purge_read(before, chunk_size=options["chunk_size"], on_chunk=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived and deleted {deleted} notifications in {time.monotonic() - started:.1f}s."
+        ))
+        self.stdout.write(f"Pruned {events.prune()} expired stream events.")
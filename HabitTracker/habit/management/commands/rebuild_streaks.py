@@ -0,0 +1,76 @@
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from habit import streaks
+from habit.models import Habit, HabitLog, User
+
+
+def _rebuild_shard(habit_ids, today, batch_size):
+    try:
+        return streaks.rebuild(habit_ids, today=today, batch_size=batch_size)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Rebuild Streak rows from HabitLog history, sharding habits across a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild habits of this user (id or email).")
+        parser.add_argument(
+            "--since", type=datetime.date.fromisoformat,
+            help="Only rebuild habits with logs on or after this date (YYYY-MM-DD).",
+        )
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Number of worker processes (default: CPU count).")
+        parser.add_argument("--shard-size", type=int, default=500,
+                            help="Habits rebuilt per worker task.")
+        parser.add_argument("--batch-size", type=int, default=1000,
+                            help="Rows per keyset query and per bulk write.")
+
+    def handle(self, *args, **options):
+        habits = Habit.objects.all()
+        if options["user"]:
+            lookup = {"pk": options["user"]} if options["user"].isdigit() else {"email": options["user"]}
+            try:
+                habits = habits.filter(user=User.objects.get(**lookup))
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist.")
+        if options["since"]:
+            habits = habits.filter(id__in=HabitLog.objects.filter(date__gte=options["since"]).values("habit_id"))
+
+        habit_ids = list(habits.order_by("id").values_list("id", flat=True))
+        size = options["shard_size"]
+        shards = [habit_ids[i:i + size] for i in range(0, len(habit_ids), size)]
+        today = datetime.date.today()
+        batch_size = options["batch_size"]
+
+        workers = min(options["workers"], len(shards))
+        if connection.vendor == "sqlite" and workers > 1:
+            self.stdout.write("SQLite allows a single writer, running in-process.")
+            workers = 1
+
+        started = time.monotonic()
+        done = 0
+        if workers <= 1:
+            for shard in shards:
+                done += streaks.rebuild(shard, today=today, batch_size=batch_size)
+                self.stdout.write(f"  {done}/{len(habit_ids)} habits")
+        else:
+            # Children must open their own connections instead of sharing ours
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+                futures = [pool.submit(_rebuild_shard, shard, today, batch_size) for shard in shards]
+                for future in as_completed(futures):
+                    done += future.result()
+                    self.stdout.write(f"  {done}/{len(habit_ids)} habits")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt streaks for {done} habits in {time.monotonic() - started:.1f}s."
+        ))
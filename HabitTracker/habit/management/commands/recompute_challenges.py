@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from habit import challenges
+from habit.models import Challenge
+
+
+class Command(BaseCommand):
+    help = "Recompute ChallengeProgress rows from HabitLog history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--challenge", type=int, help="Only recompute this challenge (id).")
+        parser.add_argument("--batch-size", type=int, default=challenges.BATCH_SIZE,
+                            help="Participants aggregated per query.")
+
+    def handle(self, *args, **options):
+        queryset = Challenge.objects.order_by("pk")
+        if options["challenge"]:
+            queryset = queryset.filter(pk=options["challenge"])
+            if not queryset.exists():
+                raise CommandError(f"Challenge {options['challenge']} does not exist.")
+
+        started, total = time.monotonic(), 0
+        for challenge in queryset.iterator():
+            total += challenges.recompute(challenge, batch_size=options["batch_size"])
+            self.stdout.write(f"  {challenge.name}: done")
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {total} participants in {time.monotonic() - started:.1f}s."
+        ))
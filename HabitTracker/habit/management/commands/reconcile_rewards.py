@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from habit import rewards
+
+
+class Command(BaseCommand):
+    help = "Verify User.points against completed logs and claimed rewards, and grant missing badges."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Correct points that do not match.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Users checked per chunk.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(users, mismatched, granted):
+            self.stdout.write(f"  {users} users checked, {mismatched} mismatched, {granted} badges granted")
+
+        users, mismatched, granted = rewards.reconcile(
+            batch_size=options["batch_size"], fix=options["fix"], on_chunk=progress,
+        )
+        action = "fixed" if options["fix"] else "found"
+        style = self.style.SUCCESS if not mismatched or options["fix"] else self.style.WARNING
+        self.stdout.write(style(
+            f"Checked {users} users in {time.monotonic() - started:.1f}s: "
+            f"{action} {mismatched} wrong totals, granted {granted} badges."
+        ))
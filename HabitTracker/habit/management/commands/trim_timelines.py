@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from habit import activity
+
+
+class Command(BaseCommand):
+    help = "Cap every activity timeline at its newest entries and prune the events left unreferenced."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int,
+                            help="Entries kept per user (default FEED_TIMELINE_SIZE).")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        owners = []
+
+        def progress(owner_id, removed):
+            owners.append(owner_id)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  user {owner_id}: {removed} entries removed")
+
+        deleted = activity.trim(options["size"], on_owner=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Trimmed {deleted} entries from {len(owners)} timelines in {time.monotonic() - started:.1f}s."
+        ))
+        started = time.monotonic()
+        pruned = activity.prune_events(options["size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {pruned} activity events in {time.monotonic() - started:.1f}s."
+        ))
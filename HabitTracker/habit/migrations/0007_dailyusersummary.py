@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_logs(apps, schema_editor):
+    # 0002 dropped the (habit, date) unique key, so a habit can have several
+    # logs for one day. Keep the oldest row with the best progress of the
+    # day and delete the rest before the key comes back.
+    HabitLog = apps.get_model('habit', 'HabitLog')
+    duplicates = list(
+        HabitLog.objects.order_by().values('habit_id', 'date')
+        .annotate(n=Count('id')).filter(n__gt=1).values_list('habit_id', 'date')
+    )
+    for habit_id, day in duplicates:
+        logs = list(HabitLog.objects.filter(habit_id=habit_id, date=day).order_by('id'))
+        kept, best = logs[0], max(logs, key=lambda log: (log.completed, log.progress))
+        kept.progress, kept.completed, kept.status = best.progress, best.completed, best.status
+        kept.save(update_fields=['progress', 'completed', 'status'])
+        HabitLog.objects.filter(pk__in=[log.pk for log in logs[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habit', '0006_habit_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_logs, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='habitlog',
+            unique_together={('habit', 'date')},
+        ),
+        migrations.CreateModel(
+            name='DailyUserSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('habits_due', models.PositiveIntegerField(default=0)),
+                ('habits_completed', models.PositiveIntegerField(default=0)),
+                ('total_progress', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily User Summaries',
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:54
+
+from zoneinfo import available_timezones
+
+from django.db import migrations, models
+
+
+def fill_buckets(apps, schema_editor):
+    Reminder = apps.get_model('habit', 'Reminder')
+    known = available_timezones()
+    reminders = list(Reminder.objects.select_related('habit__user'))
+    for reminder in reminders:
+        reminder.minute_of_day = reminder.time.hour * 60 + reminder.time.minute
+        # Unknown names fall back to UTC, as models.valid_timezone() does today
+        name = reminder.habit.user.user_timezone
+        reminder.timezone = name if name in known else 'UTC'
+    Reminder.objects.bulk_update(reminders, ['minute_of_day', 'timezone'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habit', '0008_habityearbitmap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='minute_of_day',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='timezone',
+            field=models.CharField(default='UTC', editable=False, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['minute_of_day', 'timezone'], name='habit_remin_minute__28325c_idx'),
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+    ]
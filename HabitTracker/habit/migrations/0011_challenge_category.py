@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habit', '0010_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='challenges', to='habit.category'),
+        ),
+        migrations.AddField(
+            model_name='challengeprogress',
+            name='completed_days',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
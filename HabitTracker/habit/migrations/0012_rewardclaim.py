@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_existing_claims(apps, schema_editor):
+    Reward = apps.get_model('habit', 'Reward')
+    RewardClaim = apps.get_model('habit', 'RewardClaim')
+    RewardClaim.objects.bulk_create([
+        RewardClaim(user_id=reward.user_id, reward=reward, title=reward.title, points_spent=reward.points_required)
+        for reward in Reward.objects.filter(is_claimed=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habit', '0011_challenge_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RewardClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100)),
+                ('points_spent', models.PositiveIntegerField()),
+                ('claimed_at', models.DateTimeField(auto_now_add=True)),
+                ('reward', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claim', to='habit.reward')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reward_claims', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Reward Claims',
+                'ordering': ['-claimed_at'],
+            },
+        ),
+        migrations.RunPython(record_existing_claims, migrations.RunPython.noop),
+    ]
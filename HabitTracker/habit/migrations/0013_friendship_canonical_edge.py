@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:13
+
+from django.db import migrations, models
+from django.db.models import Exists, F, OuterRef
+
+
+def canonicalize_friendships(apps, schema_editor):
+    # Friendships used to be stored once per direction. Keep the row that
+    # already has the lower user id first and flip the rest.
+    Friendship = apps.get_model('habit', 'Friendship')
+    # Rows of a user befriending themselves can't satisfy user < friend
+    Friendship.objects.filter(user_id=F('friend_id')).delete()
+    reverse = Friendship.objects.filter(user_id=OuterRef('friend_id'), friend_id=OuterRef('user_id'))
+    backwards = Friendship.objects.filter(user_id__gt=F('friend_id'))
+    # Ids are read first: MySQL can't delete from a table its subquery reads
+    mirrored = list(backwards.filter(Exists(reverse)).values_list('pk', flat=True))
+    Friendship.objects.filter(pk__in=mirrored).delete()
+    rows = list(backwards)
+    for row in rows:
+        row.user_id, row.friend_id = row.friend_id, row.user_id
+    Friendship.objects.bulk_update(rows, ['user', 'friend'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habit', '0012_rewardclaim'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_friendships, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.CheckConstraint(condition=models.Q(('user__lt', models.F('friend'))), name='friendship_canonical_edge'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('habit', '0014_activity_feed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='points',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -6,9 +6,45 @@ from django.utils import timezone
 from django.conf import settings  # Import settings to reference AUTH_USER_MODEL
 import datetime
 from django.utils.timezone import now
+from functools import lru_cache
+from zoneinfo import available_timezones
 
 from .manager import UserManager
 
+
+class ValidatedSaveMixin:
+    """
+    Runs full_clean() on every save() without repeating what the database
+    already guarantees: unique fields, unique_together and Meta.constraints
+    are left to the database (a duplicate raises IntegrityError on write),
+    foreign keys whose related object is already loaded aren't looked up
+    again, and save(update_fields=...) only validates the fields it writes.
+
+    Models whose duplicates come from user input set validate_unique_on_save
+    so they keep the uniqueness check and fail with a ValidationError.
+
+    Trusted internal writers that built the instance from validated data can
+    skip validation entirely with save(validate=False).
+    """
+    validate_unique_on_save = False
+
+    def validate_for_save(self, update_fields=None):
+        exclude = set()
+        for field in self._meta.concrete_fields:
+            if update_fields is not None and not {field.name, field.attname} & set(update_fields):
+                exclude.add(field.name)
+            elif field.many_to_one and field.is_cached(self):
+                related = field.get_cached_value(self)
+                if related is not None and getattr(related, field.target_field.attname) == getattr(self, field.attname):
+                    exclude.add(field.name)
+        self.full_clean(exclude=exclude, validate_unique=self.validate_unique_on_save, validate_constraints=False)
+
+    def save(self, *args, validate=True, **kwargs):
+        if validate:
+            self.validate_for_save(kwargs.get("update_fields"))
+        super().save(*args, **kwargs)
+
+
 class UnitType(models.Model):
     name = models.CharField(max_length=20,unique=True)
 
@@ -26,7 +62,7 @@ class Unit(models.Model):
 # -----------------------
 # 1. Custom User Model
 # -----------------------
-class User(AbstractBaseUser, PermissionsMixin):
+class User(ValidatedSaveMixin, AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True, max_length=255)
     username = models.CharField(max_length=50, unique=True)
     nickname = models.CharField(max_length=50, blank=True, null=True)
@@ -34,7 +70,9 @@ class User(AbstractBaseUser, PermissionsMixin):
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
     user_timezone = models.CharField(max_length=50, default="UTC")
     bio = models.TextField(blank=True, null=True)
-    points = models.PositiveIntegerField(default=0, validators=[MinValueValidator(0)])
+    # Signed: taking back completions whose points were already spent on
+    # rewards leaves a debt that must be earned back (see habit.rewards)
+    points = models.IntegerField(default=0)
 
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -42,6 +80,10 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     objects = UserManager()
 
+    # A duplicate email or username is a user mistake, not a bug: report it
+    # as a ValidationError (create_user, forms) instead of an IntegrityError
+    validate_unique_on_save = True
+
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
@@ -49,11 +91,18 @@ class User(AbstractBaseUser, PermissionsMixin):
         verbose_name = "User"
         verbose_name_plural = "Users"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Reminders keep a copy of the timezone and leaderboards of the
+        # points; see signals.py
+        instance._stored_timezone = instance.__dict__.get('user_timezone')
+        instance._stored_points = instance.__dict__.get('points')
+        return instance
+
     def save(self, *args, **kwargs):
-        # Auto-set completion status based on progress
-        self.contact = None if self.contact is "" else self.contact
-        self.full_clean()  # Run validation
-        super().save(*args, **kwargs)
+        self.contact = None if self.contact == "" else self.contact
+        super().save(*args, **kwargs)  # Validated by ValidatedSaveMixin
 
     def __str__(self):
         return self.email
@@ -72,7 +121,7 @@ class Category(models.Model):
         return self.name
 
 
-class Habit(models.Model):
+class Habit(ValidatedSaveMixin, models.Model):
     FREQUENCY_CHOICES = [
         ("daily", "Daily"),
         ("weekly", "Weekly"),
@@ -126,9 +175,30 @@ class Habit(models.Model):
         if self.frequency == 'custom' and (not self.custom_days or not self.custom_days.get('days')):
             raise ValidationError({'custom_days': 'Custom frequency requires a list of days.'})
 
-    def save(self, *args, **kwargs):
-        self.full_clean()  # Run validation on every save
-        super().save(*args, **kwargs)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored schedule so streaks can be rebuilt when it changes
+        instance._stored_schedule = (instance.__dict__.get('frequency'), instance.__dict__.get('custom_days'))
+        instance._stored_category = instance.__dict__.get('category_id')
+        # and the daily rollups' habits_due when the due days change
+        instance._stored_due = instance.due_schedule()
+        return instance
+
+    DUE_FIELDS = ("is_active", "start_date", "end_date", "frequency", "custom_days")
+
+    def due_schedule(self):
+        """
+        The fields that decide on which days the habit is due, as a tuple in
+        DUE_FIELDS order (see habit.schedule.is_due).
+        """
+        values = []
+        for name in self.DUE_FIELDS:
+            value = self.__dict__.get(name)
+            if name.endswith("_date") and value is not None:
+                value = self._meta.get_field(name).to_python(value)  # e.g. the timezone.now default
+            values.append(value)
+        return tuple(values)
 
     def __str__(self):
         return f"{self.user.username}: {self.name}"
@@ -137,7 +207,7 @@ class Habit(models.Model):
 # -----------------------
 # 3. Habit Logging
 # -----------------------
-class HabitLog(models.Model):
+class HabitLog(ValidatedSaveMixin, models.Model):
     STATUS_CHOICES = [
         ("pending", "Pending"),
         ("done", "Done"),
@@ -167,6 +237,17 @@ class HabitLog(models.Model):
     def find_day(self):
         return self.date.strftime("%A")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored row so streaks and rollups can diff the next save
+        instance._stored = (
+            instance.__dict__.get('date'),
+            instance.__dict__.get('completed', False),
+            instance.__dict__.get('progress', 0),
+        )
+        return instance
+
     def clean(self):
         # Ensure progress doesn't exceed the habit's target
         if self.progress > self.habit.target_per_day:
@@ -175,10 +256,10 @@ class HabitLog(models.Model):
             )
 
     def save(self, *args, **kwargs):
-        # Auto-set completion status based on progress
+        # Auto-set completion status based on progress. Loading the habit
+        # here caches it on the log, so validation and the signals reuse it.
         self.completed = (self.progress >= self.habit.target_per_day)
         self.status = 'done' if self.completed else 'pending'
-        self.full_clean()  # Run validation
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -202,6 +283,26 @@ class Streak(models.Model):
     class Meta:
         verbose_name_plural = "Streaks"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the activity feed spot milestones being crossed
+        instance._stored_current = instance.__dict__.get('current_streak')
+        return instance
+
+    def get_streak_percentage(self):
+        # Current run as a share of the best run so far
+        if not self.longest_streak:
+            return 0
+        return min(100, round(self.current_streak * 100 / self.longest_streak))
+
+    def is_almost_lost(self):
+        # Still alive, but nothing logged yet for the current period
+        from .streaks import is_alive, latest_due_period, period_counter
+        if not is_alive(self.habit, self.last_completed):
+            return False
+        return period_counter(self.habit)(self.last_completed) < latest_due_period(self.habit)
+
     def __str__(self):
         return f"{self.user.username} - {self.habit.name} (Current: {self.current_streak}, Longest: {self.longest_streak})"
 
@@ -238,9 +339,26 @@ class Reminder(models.Model):
     habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name="reminders")
     time = models.TimeField(help_text="Daily reminder time")  # Use a TimeField for clock time
     message = models.CharField(max_length=200, default="Time to complete your habit!")
+    # Dispatch bucket: ``time`` as minutes after local midnight, plus a copy
+    # of the owner's timezone so a tick can select its bucket by index alone
+    minute_of_day = models.PositiveSmallIntegerField(default=0, editable=False)
+    timezone = models.CharField(max_length=50, default="UTC", editable=False)
 
     class Meta:
         verbose_name_plural = "Reminders"
+        indexes = [
+            models.Index(fields=['minute_of_day', 'timezone']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.minute_of_day = self.time.hour * 60 + self.time.minute
+        if Reminder.habit.is_cached(self) and Habit.user.is_cached(self.habit):
+            zone = self.habit.user.user_timezone
+        else:
+            # One query for the owner's timezone instead of loading habit and user
+            zone = User.objects.filter(habits=self.habit_id).values_list('user_timezone', flat=True).first()
+        self.timezone = valid_timezone(zone)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Reminder for {self.habit.name} at {self.time}"
@@ -259,10 +377,31 @@ class Notification(models.Model):
         verbose_name_plural = "Notifications"
         ordering = ["-created_at"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the unread counter see read/unread flips made through save()
+        instance._stored_is_read = instance.__dict__.get('is_read')
+        return instance
+
     def __str__(self):
         return f"{self.user.username}: {self.message[:50]}..."
 
 
+class StreamEvent(models.Model):
+    # Notification stream events in flight between processes (see
+    # habit.events.DatabaseBroker); pruned after a few minutes
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+
+
 # -----------------------
 # 6. Social Features
 # -----------------------
@@ -274,15 +413,31 @@ class Friendship(models.Model):
     class Meta:
         unique_together = ("user", "friend")
         verbose_name_plural = "Friendships"
+        constraints = [
+            # One row per pair, lower user id first (see habit.social)
+            models.CheckConstraint(condition=models.Q(user__lt=models.F("friend")), name="friendship_canonical_edge"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} is friends with {self.friend.username}"
 
+    @staticmethod
+    def edge(a, b):
+        """
+        Return the (user_id, friend_id) the friendship of ``a`` and ``b`` is stored under.
+        """
+        return (a, b) if a < b else (b, a)
+
     def clean(self):
         # Prevent user from being friends with themselves
         if self.user == self.friend:
             raise ValidationError("Users cannot be friends with themselves.")
 
+    def save(self, *args, **kwargs):
+        if self.user_id is not None and self.friend_id is not None:
+            self.user_id, self.friend_id = Friendship.edge(self.user_id, self.friend_id)
+        super().save(*args, **kwargs)
+
 
 class FriendRequest(models.Model):
     from_user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='sent_requests', on_delete=models.CASCADE)
@@ -303,7 +458,8 @@ class FriendRequest(models.Model):
         if self.from_user == self.to_user:
             raise ValidationError("You cannot send a friend request to yourself.")
         # Check if a friendship or request already exists
-        if Friendship.objects.filter(user=self.from_user, friend=self.to_user).exists():
+        user_id, friend_id = Friendship.edge(self.from_user_id, self.to_user_id)
+        if Friendship.objects.filter(user_id=user_id, friend_id=friend_id).exists():
             raise ValidationError("A friendship already exists.")
 
 
@@ -314,10 +470,25 @@ class Challenge(models.Model):
     end_date = models.DateField()
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="created_challenges")
     participants = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="challenges")
+    # Only logs of habits in this category count; every habit counts when unset
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name="challenges")
 
     class Meta:
         verbose_name_plural = "Challenges"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Progress is recomputed when the rules change; see signals.py
+        instance._stored_rules = instance.rules()
+        return instance
+
+    def rules(self):
+        return (self.__dict__.get('start_date'), self.__dict__.get('end_date'), self.__dict__.get('category_id'))
+
+    def total_days(self):
+        return (self.end_date - self.start_date).days + 1
+
     def clean(self):
         if self.end_date <= self.start_date:
             raise ValidationError({'end_date': 'End date must be after the start date.'})
@@ -334,6 +505,8 @@ class ChallengeProgress(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(100)],  # Ensure progress is a percentage
         help_text="Percentage completion (0-100)"
     )
+    # Days in the challenge window with at least one completed linked log
+    completed_days = models.PositiveIntegerField(default=0)
     completed = models.BooleanField(default=False)
 
     class Meta:
@@ -361,9 +534,128 @@ class Reward(models.Model):
 
     def __str__(self):
         return f"{self.title} ({self.user.username})"
+
+
+class RewardClaim(models.Model):
+    """
+    Ledger of claimed rewards; one row per claim, kept when the reward is deleted.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='reward_claims', on_delete=models.CASCADE)
+    reward = models.OneToOneField(Reward, related_name='claim', on_delete=models.SET_NULL, null=True, blank=True)
+    title = models.CharField(max_length=100)
+    points_spent = models.PositiveIntegerField()
+    claimed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-claimed_at"]
+        verbose_name_plural = "Reward Claims"
+
+    def __str__(self):
+        return f"{self.user.username} claimed {self.title} ({self.points_spent} points)"
     
 
+# -----------------------
+# 8. Daily Rollups
+# -----------------------
+class DailyUserSummary(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_summaries")
+    date = models.DateField()
+    habits_due = models.PositiveIntegerField(default=0)
+    habits_completed = models.PositiveIntegerField(default=0)
+    total_progress = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # One row per user and day; also serves date range reads per user
+        unique_together = ("user", "date")
+        verbose_name_plural = "Daily User Summaries"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}: {self.habits_completed}/{self.habits_due}"
+
+
+class HabitYearBitmap(models.Model):
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name="year_bitmaps")
+    year = models.PositiveSmallIntegerField()
+    # Bit n (LSB first within each byte) is set when day n of the year is completed
+    completed_days = models.BinaryField(max_length=46, default=bytes(46))
+
+    class Meta:
+        unique_together = ("habit", "year")
+        verbose_name_plural = "Habit Year Bitmaps"
+
+    def __str__(self):
+        return f"{self.habit.name} - {self.year}"
+
+
+# -----------------------
+# 9. Notification Archive
+# -----------------------
+class NotificationArchive(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notification_archive")
+    # {"count": n, "first": iso datetime, "last": iso datetime, "months": {"YYYY-MM": n}}
+    summary = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Notification Archives"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.summary.get('count', 0)} archived"
+
+
+# -----------------------
+# 10. Activity Feed
+# -----------------------
+class ActivityEvent(models.Model):
+    KIND_CHOICES = [
+        ("completion", "Completed a habit"),
+        ("streak", "Reached a streak milestone"),
+        ("badge", "Earned a badge"),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="activity_events")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, null=True, blank=True, related_name="activity_events")
+    badge = models.ForeignKey(Badge, on_delete=models.CASCADE, null=True, blank=True, related_name="activity_events")
+    date = models.DateField()
+    value = models.PositiveIntegerField(default=0)  # Streak length for milestones
+    # False when the user had too many friends to copy it to every timeline;
+    # readers pull these from the friends' own events instead
+    fanned_out = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["user", "fanned_out", "id"]),
+        ]
+        verbose_name_plural = "Activity Events"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.get_kind_display()} ({self.date})"
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    event = models.ForeignKey(ActivityEvent, on_delete=models.CASCADE, related_name="timeline_entries")
+
+    class Meta:
+        # Event ids grow over time, so this is also the newest-first read index
+        unique_together = ("owner", "event")
+        verbose_name_plural = "Timeline Entries"
+
+    def __str__(self):
+        return f"{self.owner.username} <- {self.event}"
+
+
+
 
+@lru_cache(maxsize=1024)
+def valid_timezone(name):
+    """
+    Return ``name`` if it is a known IANA timezone, otherwise "UTC".
+    """
+    return name if name in available_timezones() else "UTC"
 
 def today_date():
     return now().date()
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+Notification fan-out.
+
+send() writes many notifications at once: chunked bulk inserts, skipping any
+(user, message) pair the user already has unread. Each chunk is its own
+transaction and moves the affected users' cached unread counters and stream
+events once it commits, so a failing chunk never leaves the counters of the
+chunks before it behind. bulk_create skips model signals, so this is the
+path that keeps both in step.
+
+Reminder dispatch calls send() with one message per reminder. notify_many()
+is the one-message-to-many-users front end, used to tell every participant
+that a challenge changed, and can hand the work to the background pool
+(background.py) so request handlers never wait on the fan-out.
+"""
+from collections import Counter
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+
+from . import events
+from .background import defer
+from .cache import adjust_unread
+from .models import Notification
+
+BATCH_SIZE = 1000
+
+
+def send(notifications, batch_size=BATCH_SIZE):
+    """
+    Insert unsaved ``Notification`` objects, leaving out duplicates of a
+    message the user has not read yet. Returns the number created.
+    """
+    created = 0
+    rows = iter(notifications)
+    while chunk := list(islice(rows, batch_size)):
+        with transaction.atomic():
+            unread = set(
+                Notification.objects.filter(
+                    user_id__in={n.user_id for n in chunk},
+                    message__in={n.message for n in chunk},
+                    is_read=False,
+                ).order_by().values_list("user_id", "message")
+            )
+            fresh = []
+            for notification in chunk:
+                key = (notification.user_id, notification.message)
+                if key not in unread:
+                    unread.add(key)
+                    fresh.append(notification)
+            Notification.objects.bulk_create(fresh, batch_size=batch_size)
+            transaction.on_commit(partial(_counted, Counter(n.user_id for n in fresh)))
+        created += len(fresh)
+    return created
+
+
+def _counted(counts):
+    for user_id, count in counts.items():
+        adjust_unread(user_id, count)
+        events.unread_changed(user_id)
+
+
+def notify_many(users, message, background=False, batch_size=BATCH_SIZE):
+    """
+    Send ``message`` to every user in ``users`` (users or user ids).
+
+    With ``background=True`` the work runs on the background pool once the
+    current transaction commits, and None is returned instead of the count.
+    """
+    user_ids = [getattr(user, "pk", user) for user in users]
+    notifications = (Notification(user_id=user_id, message=message) for user_id in user_ids)
+    if not background:
+        return send(notifications, batch_size)
+    defer(send, notifications, batch_size)
+    return None
@@ -0,0 +1,90 @@
+"""
+One-tap progress logging.
+
+log_progress() upserts today's ``HabitLog`` for a habit with a single
+conditional UPDATE (progress += amount, capped at the daily target) on the
+(habit, date) unique index, or a single INSERT when there is no row yet.
+Neither goes through save(), so the tap returns after that one write and the
+log's post_save signal, with everything derived from it (streaks, rollups,
+the heatmap, challenges, points, leaderboards, the activity feed), is sent
+from the background pool once the write commits. The dashboard cache is
+invalidated right away.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Least
+from django.db.models.signals import post_save
+
+from . import background
+from .cache import invalidate_dashboard
+from .models import Habit, HabitLog, today_date
+
+
+def _saved(habit_id, pk, day, progress, completed, stored):
+    # Rebuilt from the values of this tap rather than re-read, so every tap
+    # applies its own change however the background work interleaves.
+    # ``stored`` is the row's (date, completed, progress) before the tap, or
+    # None when the tap inserted it.
+    log = HabitLog(
+        pk=pk, habit=Habit.objects.get(pk=habit_id), date=day, progress=progress, completed=completed,
+        status="done" if completed else "pending",
+    )
+    log._state.adding = False
+    log._stored = stored or (None, False, 0)
+    with transaction.atomic():
+        post_save.send(
+            sender=HabitLog, instance=log, created=stored is None,
+            update_fields=None if stored is None else frozenset({"progress", "completed", "status"}),
+            raw=False, using=log._state.db,
+        )
+
+
+def log_progress(habit, amount=1, today=None):
+    """
+    Add ``amount`` to today's progress of ``habit`` and return the log.
+    """
+    today = today or today_date()
+    target = habit.target_per_day
+    with transaction.atomic():
+        log = HabitLog.objects.select_for_update().filter(habit=habit, date=today).first()
+        if log is None:
+            progress = min(amount, target)
+            log = HabitLog(
+                habit=habit, date=today, progress=progress, completed=progress >= target,
+                status="done" if progress >= target else "pending",
+            )
+            try:
+                with transaction.atomic():
+                    HabitLog.objects.bulk_create([log])
+            except IntegrityError:
+                # Created concurrently; increment the row that won instead
+                log = HabitLog.objects.select_for_update().get(habit=habit, date=today)
+            else:
+                if log.pk is None:
+                    # MySQL doesn't return the ids of bulk inserted rows
+                    log.pk = HabitLog.objects.filter(habit=habit, date=today).values_list("pk", flat=True).get()
+                log._state.adding = False
+                invalidate_dashboard(habit.user_id)
+                background.defer(_saved, habit.pk, log.pk, today, log.progress, log.completed, None)
+                return log
+
+        log.habit = habit
+        progress = min(log.progress + amount, target)
+        if progress == log.progress:
+            return log
+
+        done = Q(progress__gte=target - amount)
+        HabitLog.objects.filter(pk=log.pk).update(
+            # Listed before progress: MySQL assigns SET columns left to right,
+            # so these must be computed from the old progress
+            completed=done,
+            status=Case(When(done, then=Value("done")), default=Value("pending")),
+            progress=Least(F("progress") + amount, Value(target)),
+        )
+        stored = (log.date, log.completed, log.progress)
+        log.progress = progress
+        log.completed = progress >= target
+        log.status = "done" if log.completed else "pending"
+        invalidate_dashboard(habit.user_id)
+        background.defer(_saved, habit.pk, log.pk, today, log.progress, log.completed, stored)
+    return log
@@ -0,0 +1,103 @@
+"""
+Reminder dispatch.
+
+Every ``Reminder`` is bucketed by its minute of the day in the owner's
+timezone (``minute_of_day``, ``timezone``). A tick maps the current UTC
+minute to the local minute and date of every timezone some reminder is
+stored with, which collapses into a few (minute, date) groups, and loads only
+those buckets through the (minute_of_day, timezone) index. The bucket is streamed in chunks; each chunk
+costs one query for today's completed logs and a notify.send() batch.
+
+Daylight saving transitions are wall-clock gaps and repeats. Reminders set
+inside a skipped hour are sent on the first minute after the clocks jump
+forward, and a repeated hour only sends on its first pass.
+"""
+import datetime
+from itertools import islice
+from zoneinfo import ZoneInfo
+
+from django.db.models import Q
+
+from .models import HabitLog, Notification, Reminder
+from .notify import send
+from .schedule import is_due
+
+ONE_MINUTE = datetime.timedelta(minutes=1)
+
+
+def stored_timezones():
+    return sorted(Reminder.objects.order_by().values_list("timezone", flat=True).distinct())
+
+
+def local_buckets(moment, timezones):
+    """
+    Group the ``timezones`` by the local (minute of day, date) that the
+    aware datetime ``moment`` falls on. Where the clocks just jumped forward
+    a timezone is also grouped under the local minutes that were skipped;
+    during the second pass through a repeated hour it is left out.
+    """
+    groups = {}
+    for name in timezones:
+        zone = ZoneInfo(name)
+        local = moment.astimezone(zone)
+        if local.fold:
+            continue
+        wall = (moment - ONE_MINUTE).astimezone(zone).replace(tzinfo=None, fold=0)
+        while wall < local.replace(tzinfo=None):
+            wall += ONE_MINUTE
+            groups.setdefault((wall.hour * 60 + wall.minute, wall.date()), []).append(name)
+    return groups
+
+
+def due_reminders(moment):
+    """
+    Reminders whose local time is the minute of ``moment``, with the local
+    date of each bucket keyed by (timezone, minute_of_day).
+    """
+    groups = local_buckets(moment, stored_timezones())
+    if not groups:
+        return Reminder.objects.none(), {}
+    bucket = Q()
+    for (minute, _), names in groups.items():
+        bucket |= Q(minute_of_day=minute, timezone__in=names)
+    days = {(name, minute): day for (minute, day), names in groups.items() for name in names}
+    reminders = (
+        Reminder.objects.filter(bucket, habit__is_active=True)
+        .select_related("habit")
+        .only(
+            "id", "message", "timezone", "minute_of_day", "habit__id", "habit__user_id", "habit__name", "habit__is_active",
+            "habit__start_date", "habit__end_date", "habit__frequency", "habit__custom_days",
+        )
+        .order_by("pk")
+    )
+    return reminders, days
+
+
+def dispatch(moment, batch_size=1000):
+    """
+    Create the notifications for every reminder due at ``moment`` whose habit
+    is due and not yet completed that day. Returns the number sent.
+    """
+    reminders, days = due_reminders(moment)
+    rows = reminders.iterator(chunk_size=batch_size)
+    sent = 0
+    while chunk := list(islice(rows, batch_size)):
+        local = {r.pk: days[(r.timezone, r.minute_of_day)] for r in chunk}
+        done = set(
+            HabitLog.objects.filter(
+                habit_id__in={r.habit_id for r in chunk},
+                date__in=set(local.values()),
+                completed=True,
+            ).values_list("habit_id", "date")
+        )
+        notifications = [
+            Notification(user_id=r.habit.user_id, message=f"{r.habit.name}: {r.message}"[:255])
+            for r in chunk
+            if (r.habit_id, local[r.pk]) not in done and is_due(r.habit, local[r.pk])
+        ]
+        sent += send(notifications, batch_size=batch_size)
+    return sent
+
+
+def current_minute():
+    return datetime.datetime.now(datetime.timezone.utc).replace(second=0, microsecond=0)
@@ -0,0 +1,93 @@
+"""
+Notification retention.
+
+Read notifications older than ``NOTIFICATION_RETENTION_DAYS`` are folded into
+the user's ``NotificationArchive`` summary (counts per month plus the first
+and last timestamps) and deleted. The table is walked in chunks along the
+(user, is_read, created_at) index, resuming at the last user seen, and every
+chunk is archived and deleted in its own short transaction, so no single
+transaction holds locks on more than ``chunk_size`` rows.
+
+Only read rows are purged, so the unread counters never change: the chunk is
+deleted with a single raw DELETE instead of going through the post_delete
+receiver one row at a time.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from .models import Notification, NotificationArchive
+
+CHUNK_SIZE = 1000
+
+
+def cutoff(days=None):
+    days = settings.NOTIFICATION_RETENTION_DAYS if days is None else days
+    return now() - datetime.timedelta(days=days)
+
+
+def merge(summary, created):
+    """
+    Fold the ``created`` timestamps of archived notifications into a summary.
+    """
+    months = summary.setdefault("months", {})
+    for moment in created:
+        month = moment.strftime("%Y-%m")
+        months[month] = months.get(month, 0) + 1
+    summary["count"] = summary.get("count", 0) + len(created)
+    first, last = min(created).isoformat(), max(created).isoformat()
+    summary["first"] = min(summary.get("first") or first, first)
+    summary["last"] = max(summary.get("last") or last, last)
+    return summary
+
+
+def _archive_chunk(rows):
+    by_user = defaultdict(list)
+    for _, user_id, created_at in rows:
+        by_user[user_id].append(created_at)
+
+    archives = {
+        archive.user_id: archive
+        for archive in NotificationArchive.objects.select_for_update().filter(user_id__in=by_user)
+    }
+    new, moment = [], now()
+    for user_id, created in by_user.items():
+        archive = archives.get(user_id)
+        if archive is None:
+            archive = NotificationArchive(user_id=user_id, summary={})
+            new.append(archive)
+        merge(archive.summary, created)
+        archive.updated_at = moment  # bulk_update skips auto_now
+    NotificationArchive.objects.bulk_update(archives.values(), ["summary", "updated_at"], batch_size=CHUNK_SIZE)
+    NotificationArchive.objects.bulk_create(new, batch_size=CHUNK_SIZE)
+    return len(by_user)
+
+
+def purge_read(before, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """
+    Archive and delete read notifications created before ``before``. Calls
+    ``on_chunk(deleted, users)`` after each committed chunk and returns the
+    total number of notifications deleted.
+    """
+    deleted, last_user = 0, 0
+    while True:
+        with transaction.atomic():
+            # Rows before the last user's are gone, and so are that user's
+            # purged rows, so each chunk starts where the previous one ended
+            rows = list(
+                Notification.objects.filter(user_id__gte=last_user, is_read=True, created_at__lt=before)
+                .order_by("user_id", "is_read", "created_at", "pk")
+                .values_list("pk", "user_id", "created_at")[:chunk_size]
+            )
+            if not rows:
+                return deleted
+            users = _archive_chunk(rows)
+            purged = Notification.objects.filter(pk__in=[pk for pk, _, _ in rows])
+            count = purged._raw_delete(purged.db)
+        deleted += count
+        last_user = rows[-1][1]
+        if on_chunk:
+            on_chunk(count, users)
@@ -0,0 +1,191 @@
+"""
+Points and badges.
+
+Every completed log is worth ``POINTS_PER_COMPLETION`` points. Completion
+events move ``User.points`` with a single F() update; the badges whose
+``points_required`` lies between the old and new totals are then found by
+binary search over the badge thresholds, cached sorted in memory, and
+inserted in one bulk_create that ignores rows the user already has.
+
+The balance is signed and never clamped: un-completing logs whose points
+were already spent on a reward leaves it negative, so completing them again
+only pays the debt back instead of paying out a second time. It always
+equals completions earned minus points spent (see expected_points()).
+
+A badge is earned once ``points >= points_required``. award() grants the
+thresholds crossed on the way up, and reconcile() anything still missing.
+"""
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import activity, leaderboard
+from .cache import invalidate_dashboard
+from .models import Badge, HabitLog, Reward, RewardClaim, User, UserBadge
+
+BADGES_KEY = "habit:rewards:badges"
+
+
+def points_per_completion():
+    return getattr(settings, "POINTS_PER_COMPLETION", 10)
+
+
+def badge_thresholds():
+    """
+    Return (thresholds, badge_ids), both sorted by ``points_required``.
+    """
+    def load():
+        rows = list(Badge.objects.order_by("points_required", "pk").values_list("points_required", "pk"))
+        return [required for required, _ in rows], [pk for _, pk in rows]
+    return cache.get_or_set(BADGES_KEY, load, None)
+
+
+def forget_badges():
+    cache.delete(BADGES_KEY)
+
+
+def badges_between(old_points, new_points):
+    """
+    Ids of the badges earned by going from ``old_points`` to ``new_points``:
+    those not in badges_up_to(old_points) but in badges_up_to(new_points).
+    """
+    thresholds, badge_ids = badge_thresholds()
+    return badge_ids[bisect_right(thresholds, old_points):bisect_right(thresholds, new_points)]
+
+
+def badges_up_to(points):
+    thresholds, badge_ids = badge_thresholds()
+    return badge_ids[:bisect_right(thresholds, points)]
+
+
+def grant(user_id, badge_ids):
+    if not badge_ids:
+        return
+    owned = set(UserBadge.objects.filter(user_id=user_id, badge_id__in=badge_ids).values_list("badge_id", flat=True))
+    UserBadge.objects.bulk_create([UserBadge(user_id=user_id, badge_id=pk) for pk in badge_ids], ignore_conflicts=True)
+    activity.badges_awarded(user_id, [pk for pk in badge_ids if pk not in owned])
+
+
+def award(user_id, points):
+    """
+    Add ``points`` (negative to take away) to a user and grant any badges
+    crossed on the way up. Returns the new total.
+    """
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).update(points=F("points") + points)
+        total = User.objects.filter(pk=user_id).values_list("points", flat=True).first()
+        if total is None:
+            return None
+        if points > 0:
+            old = total - points
+            # Rising from zero also earns the 0 point badges, which nothing
+            # grants when an account is created
+            grant(user_id, badges_between(old, total) if old > 0 else badges_up_to(total))
+    # update() skips the User signals
+    invalidate_dashboard(user_id)
+    leaderboard.score_changed(user_id, "points", total)
+    return total
+
+
+class ClaimError(Exception):
+    pass
+
+
+def claim(user, reward):
+    """
+    Claim one of ``user``'s rewards: mark it claimed and deduct its points
+    with conditional UPDATEs in one transaction, and record the claim.
+    Raises ClaimError when it is already claimed or the user is short.
+    """
+    cost = reward.points_required
+    with transaction.atomic():
+        if not Reward.objects.filter(pk=reward.pk, user=user, is_claimed=False).update(is_claimed=True):
+            raise ClaimError("This reward has already been claimed.")
+        if not User.objects.filter(pk=user.pk, points__gte=cost).update(points=F("points") - cost):
+            # Rolls back the claimed flag with the transaction
+            raise ClaimError("Not enough points to claim this reward.")
+        entry = RewardClaim.objects.create(user=user, reward=reward, title=reward.title, points_spent=cost)
+    reward.is_claimed = True
+    user.points -= cost
+    # update() skips the User and Reward signals
+    invalidate_dashboard(user.pk)
+    leaderboard.score_changed(user.pk, "points")
+    return entry
+
+
+# -----------------------------
+# Log-driven updates
+# -----------------------------
+def log_saved(log, old_date, was_completed):
+    if log.completed != bool(was_completed):
+        award(log.habit.user_id, points_per_completion() * (1 if log.completed else -1))
+
+
+def log_deleted(log, was_completed):
+    if was_completed:
+        award(log.habit.user_id, -points_per_completion())
+
+
+# -----------------------------
+# Reconciliation
+# -----------------------------
+def expected_points(user_ids):
+    """
+    Points each user should have: completions earned minus claimed rewards
+    in the claim ledger.
+    """
+    earned = dict(
+        HabitLog.objects.filter(habit__user_id__in=user_ids, completed=True)
+        .order_by().values("habit__user_id").annotate(n=Count("id"))
+        .values_list("habit__user_id", "n")
+    )
+    spent = dict(
+        RewardClaim.objects.filter(user_id__in=user_ids)
+        .order_by().values("user_id").annotate(total=Sum("points_spent"))
+        .values_list("user_id", "total")
+    )
+    per_log = points_per_completion()
+    return {user_id: earned.get(user_id, 0) * per_log - (spent.get(user_id) or 0) for user_id in user_ids}
+
+
+def reconcile(batch_size=1000, fix=False, on_chunk=None):
+    """
+    Compare every user's points with expected_points() and grant badges
+    missing for their points, one chunk of users at a time. With ``fix``
+    wrong totals are corrected first. Returns (users, mismatched, badges).
+    """
+    users = mismatched = granted = 0
+    last_pk = 0
+    while True:
+        chunk = list(User.objects.filter(pk__gt=last_pk).order_by("pk").only("id", "points")[:batch_size])
+        if not chunk:
+            return users, mismatched, granted
+        last_pk = chunk[-1].pk
+        expected = expected_points([user.pk for user in chunk])
+        wrong = [user for user in chunk if user.points != expected[user.pk]]
+        if fix and wrong:
+            for user in wrong:
+                user.points = expected[user.pk]
+            User.objects.bulk_update(wrong, ["points"], batch_size=batch_size)
+            invalidate_dashboard(*(user.pk for user in wrong))
+            for user in wrong:
+                leaderboard.score_changed(user.pk, "points", user.points)
+
+        owned = set(
+            UserBadge.objects.filter(user__in=chunk).values_list("user_id", "badge_id")
+        )
+        missing = [
+            UserBadge(user_id=user.pk, badge_id=badge_id)
+            for user in chunk for badge_id in badges_up_to(user.points)
+            if (user.pk, badge_id) not in owned
+        ]
+        UserBadge.objects.bulk_create(missing, batch_size=batch_size, ignore_conflicts=True)
+
+        users += len(chunk)
+        mismatched += len(wrong)
+        granted += len(missing)
+        if on_chunk:
+            on_chunk(users, mismatched, granted)
@@ -0,0 +1,158 @@
+"""
+Daily completion rollups.
+
+``DailyUserSummary`` holds one row per user and day with any logged progress:
+how many habits were due, how many were completed and the summed progress.
+Days without progress have no row. Log writes adjust the row for their day
+with F() increments and drop it once it falls back to zero, so readers (calendars, stats,
+leaderboards) read one row per day instead of scanning ``HabitLog``.
+Adding, deleting or rescheduling a habit moves ``habits_due`` on the days
+the habit was or becomes due through habit_changed().
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import DailyUserSummary, Habit, HabitLog, User
+from .schedule import is_due
+
+
+def due_count(habits, day):
+    """
+    Count the habits in ``habits`` that are due on ``day``.
+    """
+    return sum(1 for habit in habits if is_due(habit, day))
+
+
+def _schedule_fields(queryset):
+    return queryset.only("id", "user_id", "is_active", "start_date", "end_date", "frequency", "custom_days")
+
+
+def _drop_empty(user_id, days):
+    DailyUserSummary.objects.filter(user_id=user_id, date__in=days, habits_completed=0, total_progress=0).delete()
+
+
+def _apply(user_id, day, completed, progress):
+    if not completed and not progress:
+        return
+    updated = DailyUserSummary.objects.filter(user_id=user_id, date=day).update(
+        habits_completed=F("habits_completed") + completed,
+        total_progress=F("total_progress") + progress,
+    )
+    if updated and (completed < 0 or progress < 0):
+        _drop_empty(user_id, [day])
+    elif not updated and (completed > 0 or progress > 0):
+        habits = _schedule_fields(Habit.objects.filter(user_id=user_id))
+        summary, created = DailyUserSummary.objects.get_or_create(
+            user_id=user_id, date=day,
+            defaults={
+                "habits_due": due_count(habits, day),
+                "habits_completed": max(completed, 0),
+                "total_progress": max(progress, 0),
+            },
+        )
+        if not created:
+            # Lost a creation race; apply the delta to the winner's row
+            _apply(user_id, day, completed, progress)
+
+
+def log_saved(log, old_date, was_completed, old_progress):
+    """
+    Apply one ``HabitLog`` write to the summaries of the days it touches.
+    """
+    user_id = log.habit.user_id
+    if old_date is not None and old_date != log.date:
+        _apply(user_id, old_date, -int(was_completed), -old_progress)
+        _apply(user_id, log.date, int(log.completed), log.progress)
+    else:
+        _apply(user_id, log.date, int(log.completed) - int(was_completed), log.progress - old_progress)
+
+
+def log_deleted(log, was_completed, progress):
+    _apply(log.habit.user_id, log.date, -int(was_completed), -progress)
+
+
+def _schedule_habit(schedule):
+    return None if schedule is None else Habit(**dict(zip(Habit.DUE_FIELDS, schedule)))
+
+
+def habit_changed(user_id, old=None, new=None, logs=(), batch_size=1000):
+    """
+    Update ``user_id``'s summaries for a habit whose due schedule went from
+    ``old`` to ``new`` (Habit.due_schedule() tuples, None when the habit was
+    added or deleted), and take away its deleted ``logs`` ((date, completed,
+    progress) tuples). Only the days that can change are read and written.
+    """
+    before, after = _schedule_habit(old), _schedule_habit(new)
+    removed = {day: (completed, progress) for day, completed, progress in logs}
+    days = Q()
+    for habit in (before, after):
+        if habit is not None and habit.is_active:
+            days |= Q(date__gte=habit.start_date, **({"date__lte": habit.end_date} if habit.end_date else {}))
+    if removed:
+        days |= Q(date__range=(min(removed), max(removed)))
+    if not days:
+        return
+
+    # Rows are grouped by the change they need, one F() UPDATE per group
+    groups = {}
+    for pk, day in DailyUserSummary.objects.filter(days, user_id=user_id).values_list("id", "date"):
+        due = (after is not None and is_due(after, day)) - (before is not None and is_due(before, day))
+        completed, progress = removed.get(day, (False, 0))
+        if due or completed or progress:
+            groups.setdefault((due, int(completed), progress), []).append(pk)
+
+    with transaction.atomic():
+        for (due, completed, progress), ids in groups.items():
+            for i in range(0, len(ids), batch_size):
+                DailyUserSummary.objects.filter(id__in=ids[i:i + batch_size]).update(
+                    habits_due=F("habits_due") + due,
+                    habits_completed=F("habits_completed") - completed,
+                    total_progress=F("total_progress") - progress,
+                )
+        if removed:
+            _drop_empty(user_id, list(removed))
+
+
+def rebuild(user_ids=None, since=None, until=None, batch_size=1000):
+    """
+    Recompute summaries from ``HabitLog`` with one grouped query per user
+    chunk, replacing the rows in the requested date range. Returns the number
+    of summary rows written.
+    """
+    users = User.objects.order_by("id").values_list("id", flat=True)
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    users = list(users)
+
+    written = 0
+    for i in range(0, len(users), batch_size):
+        chunk = users[i:i + batch_size]
+        logs = HabitLog.objects.filter(habit__user_id__in=chunk)
+        summaries = DailyUserSummary.objects.filter(user_id__in=chunk)
+        if since:
+            logs, summaries = logs.filter(date__gte=since), summaries.filter(date__gte=since)
+        if until:
+            logs, summaries = logs.filter(date__lte=until), summaries.filter(date__lte=until)
+
+        habits = {}
+        for habit in _schedule_fields(Habit.objects.filter(user_id__in=chunk)):
+            habits.setdefault(habit.user_id, []).append(habit)
+
+        rows = [
+            DailyUserSummary(
+                user_id=row["habit__user_id"],
+                date=row["date"],
+                habits_due=due_count(habits.get(row["habit__user_id"], []), row["date"]),
+                habits_completed=row["completed"],
+                total_progress=row["progress"] or 0,
+            )
+            for row in logs.order_by().values("habit__user_id", "date").annotate(
+                completed=Count("id", filter=Q(completed=True)),
+                progress=Sum("progress"),
+            ).filter(Q(completed__gt=0) | Q(progress__gt=0))
+        ]
+        with transaction.atomic():
+            summaries.delete()
+            DailyUserSummary.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return written
@@ -0,0 +1,33 @@
+"""
+Habit schedules: on which weekdays and dates a habit is due.
+
+Shared by the streak engine, the daily rollups and reminder dispatch.
+"""
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def scheduled_weekdays(habit):
+    """
+    Return the sorted weekday numbers (Mon=0) a habit is due on.
+    Accepts both {"days": ["Mon", ...]} and a bare list of day names.
+    """
+    if habit.frequency != "custom":
+        return list(range(7))
+    days = habit.custom_days or []
+    if isinstance(days, dict):
+        days = days.get("days") or []
+    schedule = {WEEKDAYS.index(d) for d in (str(day).strip()[:3].title() for day in days) if d in WEEKDAYS}
+    return sorted(schedule) or list(range(7))
+
+
+def is_due(habit, day):
+    """
+    A habit is due on ``day`` when it is active, within its start/end dates
+    and scheduled on that weekday.
+    """
+    return (
+        habit.is_active
+        and habit.start_date <= day
+        and (habit.end_date is None or day <= habit.end_date)
+        and day.weekday() in scheduled_weekdays(habit)
+    )
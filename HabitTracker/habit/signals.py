@@ -0,0 +1,239 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import activity, challenges, events, heatmap, leaderboard, notify, rewards, rollups, social, streaks
+from .cache import adjust_unread, invalidate_dashboard
+from .models import (
+    Badge, Challenge, ChallengeProgress, Friendship, Habit, HabitLog, Notification, Reminder, Streak, Reward, User, valid_timezone,
+)
+
+
+# -----------------------------
+# STREAKS / DAILY ROLLUPS / HEATMAP
+# -----------------------------
+@receiver(post_save, sender=HabitLog)
+def habit_log_saved(sender, instance, created, **kwargs):
+    old_date, was_completed, old_progress = getattr(instance, '_stored', (None, False, 0))
+    # The streak's leaderboard move and the activity event both need the
+    # user's friends; read them once
+    with social.remembering():
+        streaks.log_saved(instance, old_date, was_completed)
+        rollups.log_saved(instance, old_date, was_completed, old_progress)
+        heatmap.log_saved(instance, old_date, was_completed)
+        challenges.log_saved(instance, old_date, was_completed)
+        rewards.log_saved(instance, old_date, was_completed)
+        activity.log_saved(instance, old_date, was_completed)
+    instance._stored = (instance.date, instance.completed, instance.progress)
+
+
+@receiver(post_delete, sender=HabitLog)
+def habit_log_deleted(sender, instance, origin=None, **kwargs):
+    # Logs removed by a cascading Habit/User delete are handled by the Habit
+    # signals below (the streak goes with the habit)
+    if getattr(origin, 'model', type(origin)) is not HabitLog:
+        return
+    _, was_completed, progress = getattr(instance, '_stored', (None, instance.completed, instance.progress))
+    streaks.log_deleted(instance, was_completed)
+    rollups.log_deleted(instance, was_completed, progress)
+    heatmap.log_deleted(instance, was_completed)
+    challenges.log_deleted(instance, was_completed)
+    rewards.log_deleted(instance, was_completed)
+    activity.log_deleted(instance, was_completed)
+
+
+@receiver(pre_delete, sender=Habit)
+def habit_deleting(sender, instance, origin=None, **kwargs):
+    # Summaries of a deleted user go with the user
+    if not isinstance(origin, User):
+        instance._deleted_logs = list(instance.logs.values_list('date', 'completed', 'progress'))
+
+
+@receiver(post_delete, sender=Habit)
+def habit_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User):
+        return
+    logs = getattr(instance, '_deleted_logs', [])
+    rollups.habit_changed(instance.user_id, old=getattr(instance, '_stored_due', instance.due_schedule()), logs=logs)
+    completed = [day for day, is_completed, _ in logs if is_completed]
+    if completed:
+        challenges.recompute_user(
+            instance.user_id, category_ids=[instance.category_id, None], since=min(completed), until=max(completed),
+        )
+
+
+@receiver(post_save, sender=Habit)
+def habit_saved(sender, instance, created, **kwargs):
+    schedule = (instance.frequency, instance.custom_days)
+    stored = getattr(instance, '_stored_schedule', schedule)
+    if not created and stored != schedule:
+        streaks.recompute(instance)
+    instance._stored_schedule = schedule
+    if not created and getattr(instance, '_stored_category', instance.category_id) != instance.category_id:
+        # Challenges counting every habit are not affected
+        challenges.recompute_user(instance.user_id, category_ids=[pk for pk in (instance._stored_category, instance.category_id) if pk])
+    instance._stored_category = instance.category_id
+    due = instance.due_schedule()
+    if created or getattr(instance, '_stored_due', due) != due:
+        rollups.habit_changed(instance.user_id, old=None if created else instance._stored_due, new=due)
+    instance._stored_due = due
+
+
+# -----------------------------
+# BADGES
+# -----------------------------
+@receiver([post_save, post_delete], sender=Badge)
+def badge_changed(sender, instance, **kwargs):
+    rewards.forget_badges()
+
+
+# -----------------------------
+# CHALLENGE PROGRESS
+# -----------------------------
+@receiver(post_save, sender=Challenge)
+def challenge_saved(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_stored_rules', instance.rules()) != instance.rules():
+        challenges.recompute(instance)
+        participants = instance.participants.values_list('pk', flat=True)
+        notify.notify_many(
+            participants, f"The challenge {instance.name} has changed; check your progress."[:255], background=True,
+        )
+    instance._stored_rules = instance.rules()
+
+
+@receiver(m2m_changed, sender=Challenge.participants.through)
+def challenge_participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # user.challenges.add(...): ``instance`` is the user
+        found = Challenge.objects.filter(pk__in=pk_set) if pk_set else Challenge.objects.none()
+        for challenge in found:
+            challenges.recompute(challenge, user_ids=[instance.pk])
+        if action == 'post_clear':
+            ChallengeProgress.objects.filter(user=instance).delete()
+    elif action == 'post_clear':
+        ChallengeProgress.objects.filter(challenge=instance).delete()
+    else:
+        challenges.recompute(instance, user_ids=pk_set)
+
+
+# -----------------------------
+# DASHBOARD CACHE
+# -----------------------------
+@receiver([post_save, post_delete], sender=HabitLog)
+def habit_log_changed_dashboard(sender, instance, origin=None, **kwargs):
+    # A cascading Habit/User delete invalidates once through its own signal
+    if origin is not None and getattr(origin, 'model', type(origin)) is not HabitLog:
+        return
+    invalidate_dashboard(instance.habit.user_id)
+
+
+@receiver([post_save, post_delete], sender=Habit)
+@receiver([post_save, post_delete], sender=Streak)
+@receiver([post_save, post_delete], sender=Reward)
+def user_data_changed_dashboard(sender, instance, **kwargs):
+    invalidate_dashboard(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_saved_dashboard(sender, instance, **kwargs):
+    # Covers points changes made through save()
+    invalidate_dashboard(instance.pk)
+
+
+# -----------------------------
+# REMINDER BUCKETS
+# -----------------------------
+@receiver(post_save, sender=User)
+def user_timezone_changed(sender, instance, created, **kwargs):
+    stored = getattr(instance, '_stored_timezone', instance.user_timezone)
+    if not created and stored != instance.user_timezone:
+        Reminder.objects.filter(habit__user=instance).update(timezone=valid_timezone(instance.user_timezone))
+    instance._stored_timezone = instance.user_timezone
+
+
+# -----------------------------
+# LEADERBOARDS
+# -----------------------------
+@receiver(post_save, sender=ChallengeProgress)
+def challenge_progress_saved(sender, instance, **kwargs):
+    leaderboard.progress_changed(instance.challenge_id, instance.user_id, instance.progress)
+
+
+@receiver(post_delete, sender=ChallengeProgress)
+def challenge_progress_deleted(sender, instance, **kwargs):
+    leaderboard.progress_removed(instance.challenge_id, instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def user_points_changed(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_stored_points', instance.points) != instance.points:
+        leaderboard.score_changed(instance.pk, 'points', instance.points)
+    instance._stored_points = instance.points
+
+
+@receiver([post_save, post_delete], sender=Streak)
+def streak_changed_leaderboard(sender, instance, origin=None, **kwargs):
+    # A cascading user delete takes the user off every board anyway
+    if isinstance(origin, User):
+        return
+    leaderboard.score_changed(instance.user_id, 'streak')
+
+
+@receiver([post_save, post_delete], sender=Friendship)
+def friendship_changed_leaderboard(sender, instance, **kwargs):
+    # The boards are rebuilt from the friend graph, so forget its copy first
+    social.forget(instance.user_id, instance.friend_id)
+    leaderboard.friendship_changed(instance.user_id, instance.friend_id)
+
+
+# -----------------------------
+# UNREAD NOTIFICATION COUNTER
+# -----------------------------
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    was_unread = False if created else not getattr(instance, '_stored_is_read', instance.is_read)
+    delta = int(not instance.is_read) - int(was_unread)
+    # The cached counter is not transactional, so move it only once the row is
+    # committed, as notify.send() does
+    if delta:
+        transaction.on_commit(partial(adjust_unread, instance.user_id, delta))
+    instance._stored_is_read = instance.is_read
+    if created:
+        events.notification_created(instance)
+    if delta:
+        events.unread_changed(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    if not getattr(instance, '_stored_is_read', instance.is_read):
+        transaction.on_commit(partial(adjust_unread, instance.user_id, -1))
+        events.unread_changed(instance.user_id)
+
+
+# -----------------------------
+# ACTIVITY FEED
+# -----------------------------
+@receiver(post_save, sender=Streak)
+def streak_saved_activity(sender, instance, created, **kwargs):
+    old_current = 0 if created else getattr(instance, '_stored_current', instance.current_streak)
+    activity.streak_saved(instance, old_current)
+    instance._stored_current = instance.current_streak
+
+
+@receiver(post_save, sender=Friendship)
+def friendship_saved_activity(sender, instance, created, **kwargs):
+    if created:
+        activity.friendship_added(instance.user_id, instance.friend_id)
+
+
+@receiver(post_delete, sender=Friendship)
+def friendship_deleted_activity(sender, instance, origin=None, **kwargs):
+    # A deleted user's events, and the entries copying them, go with the user
+    if isinstance(origin, User):
+        return
+    activity.friendship_removed(instance.user_id, instance.friend_id)
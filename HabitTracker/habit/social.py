@@ -0,0 +1,231 @@
+"""
+Friend graph.
+
+A friendship is one undirected edge stored as a single ``Friendship`` row with
+the lower user id in ``user`` and the higher in ``friend`` (Friendship.edge()).
+A user's neighbors are therefore the ``friend`` ids of rows where they are
+``user`` plus the ``user`` ids of rows where they are ``friend``; both halves
+are read through an index (the unique (user, friend) pair and the ``friend``
+foreign key).
+
+Neighbor sets can be kept in an in-process LRU cache of
+``FRIEND_GRAPH_CACHE_SIZE`` users (0 turns it off). signals.py forgets both
+ends of an edge whenever it is written or deleted. Like the local cache in
+settings, entries are per process, so only enable it where every process
+sees the friendship writes (a single worker) or can tolerate that lag.
+
+Independently of that cache, remembering() keeps every neighbor set read
+inside one block of work, so the derived updates of a single log write (the
+activity feed, the leaderboards) share one read of the user's friends.
+"""
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Friendship, User
+
+
+class AdjacencyCache:
+    """
+    Bounded LRU map of user id -> frozenset of neighbor ids.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            neighbors = self._entries.get(user_id)
+            if neighbors is not None:
+                self._entries.move_to_end(user_id)
+            return neighbors
+
+    def set(self, user_id, neighbors):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = neighbors
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = AdjacencyCache(getattr(settings, "FRIEND_GRAPH_CACHE_SIZE", 0))
+    return _cache
+
+
+def reset_cache():
+    """
+    Drop every cached neighbor set and pick up the current
+    ``FRIEND_GRAPH_CACHE_SIZE`` on next use.
+    """
+    global _cache
+    _cache = None
+
+
+_local = threading.local()
+
+
+@contextmanager
+def remembering():
+    """
+    Read each user's neighbors at most once until the block exits. Nested
+    blocks share the outermost one's memo.
+    """
+    if getattr(_local, "memo", None) is not None:
+        yield
+        return
+    _local.memo = {}
+    try:
+        yield
+    finally:
+        _local.memo = None
+
+
+def forget(*user_ids):
+    """
+    Drop the cached neighbors of ``user_ids``, now and once the surrounding
+    transaction commits (a concurrent reader may have refilled the entry from
+    the old rows in between).
+    """
+    memo = getattr(_local, "memo", None)
+    if memo is not None:
+        for user_id in user_ids:
+            memo.pop(user_id, None)
+    get_cache().delete(*user_ids)
+    transaction.on_commit(lambda: get_cache().delete(*user_ids))
+
+
+# -----------------------------
+# Edges
+# -----------------------------
+def _edge(a, b):
+    user_id, friend_id = Friendship.edge(a, b)
+    return Friendship.objects.filter(user_id=user_id, friend_id=friend_id)
+
+
+def are_friends(a, b):
+    if a == b:
+        return False
+    cached = get_cache().get(a)
+    if cached is not None:
+        return b in cached
+    return _edge(a, b).exists()
+
+
+def add(a, b):
+    """
+    Make ``a`` and ``b`` friends. Returns (friendship, created).
+    """
+    user_id, friend_id = Friendship.edge(a, b)
+    return Friendship.objects.get_or_create(user_id=user_id, friend_id=friend_id)
+
+
+def remove(a, b):
+    """
+    End the friendship between ``a`` and ``b``. Returns True if there was one.
+    """
+    friendship = _edge(a, b).first()
+    if friendship is None:
+        return False
+    friendship.delete()
+    return True
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+def neighbors(user_id):
+    """
+    Return the frozenset of ids of ``user_id``'s friends.
+    """
+    memo = getattr(_local, "memo", None)
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+    cache = get_cache()
+    neighbors = cache.get(user_id)
+    if neighbors is None:
+        lower = Friendship.objects.filter(user_id=user_id).values_list("friend_id", flat=True)
+        higher = Friendship.objects.filter(friend_id=user_id).values_list("user_id", flat=True)
+        neighbors = frozenset(lower.union(higher, all=True))
+        cache.set(user_id, neighbors)
+    if memo is not None:
+        memo[user_id] = neighbors
+    return neighbors
+
+
+def friendships(user_id):
+    """
+    Return the user's ``Friendship`` rows with both users loaded. Each row
+    gets an ``other`` attribute holding the friend, whichever side they are on.
+    """
+    rows = list(
+        Friendship.objects.filter(Q(user_id=user_id) | Q(friend_id=user_id))
+        .select_related("user", "friend")
+    )
+    for row in rows:
+        row.other = row.friend if row.user_id == user_id else row.user
+    rows.sort(key=lambda row: row.other.username.lower())
+    return rows
+
+
+def mutual(a, b):
+    """
+    Return the ids of the friends ``a`` and ``b`` have in common.
+    """
+    return neighbors(a) & neighbors(b)
+
+
+def suggestions(user_id, limit=10, friends=None):
+    """
+    Suggest friends of friends who are not yet friends of ``user_id``, most
+    mutual friends first. Returns ``User`` objects with a ``mutual_count``.
+    Pass ``friends`` when the caller already has the user's friend ids.
+
+    The counting is done by the database: one grouped query per side of the
+    edge, each restricted to rows touching one of the user's friends.
+    """
+    friends = neighbors(user_id) if friends is None else frozenset(friends)
+    if not friends:
+        return []
+    known = friends | {user_id}
+    counts = Counter()
+    for near, far in (("user_id", "friend_id"), ("friend_id", "user_id")):
+        rows = (
+            Friendship.objects.filter(**{f"{near}__in": friends})
+            .exclude(**{f"{far}__in": known})
+            .order_by()
+            .values_list(far)
+            .annotate(mutual=Count("id"))
+        )
+        counts.update(dict(rows))
+
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    users = User.objects.in_bulk([candidate for candidate, _ in ranked])
+    result = []
+    for candidate, mutual_count in ranked:
+        user = users.get(candidate)
+        if user is not None:
+            user.mutual_count = mutual_count
+            result.append(user)
+    return result
@@ -0,0 +1,384 @@
+"""
+Incremental streak engine.
+
+Keeps the ``Streak`` row of every habit in step with its ``HabitLog`` rows.
+Each completed log is mapped to a *period* (a day, an ISO week or one of the
+scheduled days of a custom habit) numbered so that consecutive periods differ
+by exactly one. A streak is a run of consecutive completed periods.
+
+Appending today's completion is O(1). Edits in the past only walk the run
+around the edited day, never the whole history of the habit.
+"""
+import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .cache import invalidate_dashboard
+from .models import Habit, HabitLog, Streak
+from .schedule import scheduled_weekdays
+
+# Number of log dates read per query while walking along a run.
+WALK_CHUNK = 64
+
+
+# -----------------------------
+# Periods
+# -----------------------------
+def period_counter(habit):
+    """
+    Return a function mapping a date to its period index for ``habit``,
+    or to None when a custom habit is not due that day.
+    """
+    if habit.frequency == "weekly":
+        # Day 0 (0001-01-01) is a Monday, so this lines up with ISO weeks.
+        return lambda day: (day.toordinal() - 1) // 7
+
+    if habit.frequency == "custom":
+        schedule = scheduled_weekdays(habit)
+        rank = {weekday: i for i, weekday in enumerate(schedule)}
+
+        def period(day):
+            ordinal = day.toordinal() - 1
+            if ordinal % 7 not in rank:
+                return None
+            return (ordinal // 7) * len(schedule) + rank[ordinal % 7]
+        return period
+
+    return lambda day: day.toordinal()
+
+
+def period_bounds(habit, day):
+    """
+    Return the first and last date of the period ``day`` falls in.
+    """
+    if habit.frequency == "weekly":
+        monday = day - datetime.timedelta(days=day.weekday())
+        return monday, monday + datetime.timedelta(days=6)
+    return day, day
+
+
+def latest_due_period(habit, today=None):
+    """
+    Return the period of the most recent due day on or before ``today``.
+    """
+    period = period_counter(habit)
+    day = today or now().date()
+    for _ in range(7):
+        p = period(day)
+        if p is not None:
+            return p
+        day -= datetime.timedelta(days=1)
+    return None
+
+
+def is_alive(habit, last_completed, today=None):
+    """
+    A streak is alive while its last completed period is the current one or
+    the one right before it (the user still has time to extend it).
+    """
+    if last_completed is None:
+        return False
+    return latest_due_period(habit, today) - period_counter(habit)(last_completed) <= 1
+
+
+def projected(habit, streak, day):
+    """
+    ``streak.current_streak`` once a completion on ``day``, the habit's newest
+    log, is counted: the read-only counterpart of _add()'s append cases, for
+    responses that don't wait for the streak engine.
+    """
+    period = period_counter(habit)
+    p = period(day)
+    current = streak.current_streak if streak else 0
+    last = streak.last_completed if streak else None
+    if p is None:
+        return current
+    if last is None or p > period(last) + 1:
+        return 1
+    return current + 1 if p == period(last) + 1 else current
+
+
+def alive_q(today, frequency="habit__frequency", last_completed="last_completed"):
+    """
+    Database-side counterpart of is_alive() for filtering streak rows. Exact
+    for daily and weekly habits; custom habits are given a full week.
+    """
+    monday = today - datetime.timedelta(days=today.weekday())
+    return (
+        Q(**{frequency: "daily", f"{last_completed}__gte": today - datetime.timedelta(days=1)})
+        | Q(**{frequency: "weekly", f"{last_completed}__gte": monday - datetime.timedelta(days=7)})
+        | Q(**{frequency: "custom", f"{last_completed}__gte": today - datetime.timedelta(days=7)})
+    )
+
+
+def scan(habit, dates):
+    """
+    Compute streak state in one pass over completed log dates in ascending
+    order. Returns (current, longest, start, last) where ``current`` is the
+    length of the latest run.
+    """
+    period = period_counter(habit)
+    current = longest = 0
+    start = last = None
+    last_period = None
+    for day in dates:
+        p = period(day)
+        if p is None:
+            continue
+        if p == last_period:
+            last = day
+            continue
+        if last_period is not None and p == last_period + 1:
+            current += 1
+        else:
+            current, start = 1, day
+        last, last_period = day, p
+        longest = max(longest, current)
+    return current, longest, start, last
+
+
+# -----------------------------
+# Log-driven updates
+# -----------------------------
+def log_saved(log, old_date, was_completed):
+    """
+    Apply one ``HabitLog`` write. ``old_date`` and ``was_completed`` describe
+    the row as it was stored before this save (None/False for a new log).
+    """
+    moved = old_date is not None and old_date != log.date
+    if was_completed and (moved or not log.completed):
+        _remove(log.habit, old_date)
+    if log.completed and (moved or not was_completed):
+        _add(log.habit, log.date)
+
+
+def log_deleted(log, was_completed):
+    """
+    Apply the deletion of a log that was stored as ``was_completed``.
+    """
+    if was_completed:
+        _remove(log.habit, log.date)
+
+
+def recompute(habit, today=None):
+    """
+    Rebuild a habit's streak from its full log history. Only needed when the
+    habit's schedule changes, since that renumbers every period.
+    """
+    with transaction.atomic():
+        streak = _locked_streak(habit, create=True)
+        current, longest, start, last = scan(habit, _completed_dates(habit).order_by("date").iterator())
+        streak.current_streak, streak.longest_streak = current, longest
+        streak.start_date = start or streak.start_date
+        streak.last_completed = last
+        streak.is_active = is_alive(habit, last, today)
+        streak.save()
+    return streak
+
+
+def rebuild(habit_ids, today=None, batch_size=1000):
+    """
+    Recompute the streaks of many habits from scratch. Completed logs are
+    read in (habit_id, date) order so each habit is scanned exactly once,
+    and the results are written back with bulk_update/bulk_create. The
+    users' dashboards are invalidated. Returns the number of habits rebuilt.
+    """
+    habits = Habit.objects.filter(id__in=habit_ids).only("id", "user_id", "frequency", "custom_days")
+    habits = {habit.id: habit for habit in habits}
+    existing = {}
+    for streak in Streak.objects.filter(habit_id__in=habits).order_by("-pk"):
+        existing[streak.habit_id] = streak  # Oldest row wins, as in _locked_streak
+
+    results = {}
+    logs = _completed_logs(habits, batch_size)
+    for habit_id, rows in groupby(logs, key=itemgetter(0)):
+        results[habit_id] = scan(habits[habit_id], (day for _, day in rows))
+
+    to_create, to_update = [], []
+    for habit_id, habit in habits.items():
+        current, longest, start, last = results.get(habit_id, (0, 0, None, None))
+        streak = existing.get(habit_id)
+        if streak is None:
+            streak = Streak(user_id=habit.user_id, habit_id=habit_id)
+            to_create.append(streak)
+        else:
+            to_update.append(streak)
+        streak.current_streak, streak.longest_streak = current, longest
+        streak.start_date = start or streak.start_date
+        streak.last_completed = last
+        streak.is_active = is_alive(habit, last, today)
+
+    with transaction.atomic():
+        Streak.objects.bulk_update(
+            to_update,
+            ["current_streak", "longest_streak", "start_date", "last_completed", "is_active"],
+            batch_size=batch_size,
+        )
+        Streak.objects.bulk_create(to_create, batch_size=batch_size)
+    # bulk writes skip the Streak signals
+    invalidate_dashboard(*{habit.user_id for habit in habits.values()})
+    return len(habits)
+
+
+def _completed_logs(habit_ids, batch_size):
+    """
+    Yield (habit_id, date) of the completed logs of ``habit_ids`` in that
+    order, ``batch_size`` rows per keyset query on the (habit, date) key.
+    mysqlclient buffers a whole result set client side, even for
+    iterator(), so this is what keeps memory bounded.
+    """
+    logs = HabitLog.objects.filter(habit_id__in=habit_ids, completed=True).order_by("habit_id", "date")
+    batch = list(logs.values_list("habit_id", "date")[:batch_size])
+    while batch:
+        yield from batch
+        habit_id, day = batch[-1]
+        batch = list(
+            logs.filter(Q(habit_id__gt=habit_id) | Q(habit_id=habit_id, date__gt=day))
+            .values_list("habit_id", "date")[:batch_size]
+        )
+
+
+def _completed_dates(habit):
+    logs = HabitLog.objects.filter(habit=habit, completed=True)
+    if habit.frequency == "custom":
+        # Logs on days the habit is not due never count (week_day: Sunday=1)
+        logs = logs.filter(date__week_day__in=[(d + 1) % 7 + 1 for d in scheduled_weekdays(habit)])
+    return logs.values_list("date", flat=True)
+
+
+def _locked_streak(habit, create):
+    streak = Streak.objects.select_for_update().filter(habit=habit).order_by("pk").first()
+    if streak is None and create:
+        streak = Streak(user_id=habit.user_id, habit=habit, current_streak=0, longest_streak=0)
+    return streak
+
+
+def _walk(habit, period, day, step, stop=None):
+    """
+    Follow consecutive completed periods away from ``day`` in direction
+    ``step`` (-1 or +1) and return (date, period) of the far edge of the run.
+    The walk ends early on reaching period ``stop``, which the caller already
+    knows to be the start of a contiguous run.
+    """
+    edge_day, edge_period = day, period(day)
+    cursor = day
+    while True:
+        if step < 0:
+            chunk = _completed_dates(habit).filter(date__lt=cursor).order_by("-date")
+        else:
+            chunk = _completed_dates(habit).filter(date__gt=cursor).order_by("date")
+        chunk = list(chunk[:WALK_CHUNK])
+        for d in chunk:
+            p = period(d)
+            if p is None:
+                continue
+            if p != edge_period and p != edge_period + step:
+                return edge_day, edge_period
+            edge_day, edge_period = d, p
+            if p == stop:
+                return edge_day, edge_period
+        if len(chunk) < WALK_CHUNK:
+            return edge_day, edge_period
+        cursor = chunk[-1]
+
+
+def _longest_run(habit):
+    return scan(habit, _completed_dates(habit).order_by("date").iterator())[1]
+
+
+def _add(habit, day):
+    period = period_counter(habit)
+    p = period(day)
+    if p is None:
+        return  # Custom habit logged on a day it is not due
+
+    with transaction.atomic():
+        streak = _locked_streak(habit, create=True)
+        last = streak.last_completed
+        lp = period(last) if last else None
+        sp = period(streak.start_date) if last else None
+
+        if lp is not None and sp <= p <= lp:
+            # Period already counted (e.g. a second log in the same week)
+            streak.start_date = min(streak.start_date, day)
+            streak.last_completed = max(last, day)
+        elif lp is not None and p == lp + 1:
+            streak.current_streak += 1
+            streak.last_completed = day
+        elif lp is not None and p > lp + 1:
+            streak.current_streak = 1
+            streak.start_date = streak.last_completed = day
+        else:
+            # Out-of-order edit: only the run around ``day`` can change
+            start_day, start_period = _walk(habit, period, day, -1)
+            end_day, end_period = _walk(habit, period, day, +1, stop=sp)
+            run = end_period - start_period + 1
+            if lp is None:
+                streak.current_streak = run
+                streak.start_date, streak.last_completed = start_day, end_day
+            elif end_period == sp:
+                streak.current_streak = lp - start_period + 1
+                streak.start_date = start_day
+            streak.longest_streak = max(streak.longest_streak, run)
+
+        streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+        streak.is_active = is_alive(habit, streak.last_completed)
+        streak.save()
+
+
+def _remove(habit, day):
+    period = period_counter(habit)
+    p = period(day)
+    if p is None:
+        return
+
+    with transaction.atomic():
+        streak = _locked_streak(habit, create=False)
+        if streak is None or streak.last_completed is None:
+            return
+
+        first, last_of_period = period_bounds(habit, day)
+        if first != last_of_period:
+            remaining = list(_completed_dates(habit).filter(date__range=(first, last_of_period)))
+            if remaining:
+                # The period is still satisfied by another log
+                if streak.start_date == day:
+                    streak.start_date = min(remaining)
+                if streak.last_completed == day:
+                    streak.last_completed = max(remaining)
+                streak.save()
+                return
+
+        lp = period(streak.last_completed)
+        sp = period(streak.start_date)
+        if sp <= p <= lp:
+            broken = streak.current_streak
+            if p < lp:
+                # The run splits; its later half stays current
+                streak.current_streak = lp - p
+                streak.start_date = _completed_dates(habit).filter(date__gt=day).order_by("date").first()
+            elif p > sp:
+                streak.current_streak = lp - sp
+                streak.last_completed = _completed_dates(habit).filter(date__lt=day).order_by("-date").first()
+            else:
+                # The current run is gone; the previous run, if any, takes over
+                previous = _completed_dates(habit).filter(date__lt=day).order_by("-date").first()
+                streak.current_streak, streak.last_completed = 0, previous
+                if previous is not None:
+                    start_day, start_period = _walk(habit, period, previous, -1)
+                    streak.current_streak = period(previous) - start_period + 1
+                    streak.start_date = start_day
+        else:
+            start_day, start_period = _walk(habit, period, day, -1)
+            end_day, end_period = _walk(habit, period, day, +1)
+            broken = end_period - start_period + 1
+
+        if broken >= streak.longest_streak:
+            # The record run was broken; this is the only full-history read
+            streak.longest_streak = _longest_run(habit)
+        streak.is_active = is_alive(habit, streak.last_completed)
+        streak.save()
@@ -1,3 +1,1103 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.test import TestCase, TransactionTestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.utils.timezone import now
+
+from . import activity, challenges, events, heatmap, leaderboard, notify, reminders, retention, rewards, rollups, social, streaks
+from .cache import unread_count
+from .dashboard import get_dashboard
+from .pagination import PAGE_SIZE, keyset_page
+from .models import (
+    ActivityEvent, Badge, Category, Challenge, ChallengeProgress, DailyUserSummary, FriendRequest, Friendship, Habit,
+    HabitLog, Notification, NotificationArchive, Reminder, Reward, RewardClaim, Streak, TimelineEntry, Unit, User,
+    UserBadge, today_date,
+)
+from .urls import urlpatterns
+
+
+class StreakEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="streaks@example.com", password="secret-pass-123")
+        cls.unit = Unit.objects.create(name="times")
+
+    def setUp(self):
+        cache.clear()
+
+    def habit(self, **fields):
+        return Habit.objects.create(
+            user=self.user, name="Read", unit=self.unit, target_per_day=1,
+            start_date=today_date() - datetime.timedelta(days=60), **fields,
+        )
+
+    def assert_streak(self, habit, current, longest):
+        streak = Streak.objects.get(habit=habit)
+        dates = HabitLog.objects.filter(habit=habit, completed=True).order_by("date").values_list("date", flat=True)
+        self.assertEqual((streak.current_streak, streak.longest_streak), (current, longest))
+        self.assertEqual(streaks.scan(habit, dates)[:2], (current, longest))
+
+    def test_edits_in_the_past_match_a_full_scan(self):
+        habit, today = self.habit(), today_date()
+        logs = {
+            offset: HabitLog.objects.create(habit=habit, date=today - datetime.timedelta(days=offset), progress=1)
+            for offset in (0, 1, 2, 4, 5, 6, 7)
+        }
+        self.assert_streak(habit, 3, 4)
+
+        HabitLog.objects.create(habit=habit, date=today - datetime.timedelta(days=3), progress=1)
+        self.assert_streak(habit, 8, 8)
+
+        logs[5].delete()
+        self.assert_streak(habit, 5, 5)
+
+        logs[1].progress = 0
+        logs[1].save()
+        self.assert_streak(habit, 1, 3)
+
+    def test_custom_habits_count_only_scheduled_days(self):
+        habit, today = self.habit(frequency="custom", custom_days={"days": ["Mon", "Wed"]}), today_date()
+        scheduled = [today - datetime.timedelta(days=offset) for offset in range(14)]
+        scheduled = [day for day in scheduled if day.weekday() in (0, 2)][:3]
+        for day in scheduled:
+            HabitLog.objects.create(habit=habit, date=day, progress=1)
+        # The day before a Monday or Wednesday is never scheduled; a
+        # completion there neither extends nor breaks the run
+        HabitLog.objects.create(habit=habit, date=scheduled[0] - datetime.timedelta(days=1), progress=1)
+        self.assert_streak(habit, 3, 3)
+
+    def test_weekly_habits_count_one_period_per_iso_week(self):
+        habit, today = self.habit(frequency="weekly"), today_date()
+        monday = today - datetime.timedelta(days=today.weekday())
+        for day in (monday, monday - datetime.timedelta(days=5), monday - datetime.timedelta(days=4), monday - datetime.timedelta(days=8)):
+            HabitLog.objects.create(habit=habit, date=day, progress=1)
+        self.assert_streak(habit, 3, 3)
+
+        # A whole missed week splits the run
+        HabitLog.objects.filter(habit=habit, date__in=[monday - datetime.timedelta(days=5), monday - datetime.timedelta(days=4)]).delete()
+        self.assert_streak(habit, 1, 1)
+
+
+class RebuildStreaksCommandTests(TestCase):
+    def test_user_and_since_limit_the_rebuilt_habits(self):
+        unit, today = Unit.objects.create(name="times"), today_date()
+        owner = User.objects.create_user(email="owner@example.com", password="secret-pass-123", username="owner")
+        other = User.objects.create_user(email="other@example.com", password="secret-pass-123", username="other")
+        recent = Habit.objects.create(user=owner, name="Recent", unit=unit)
+        stale = Habit.objects.create(user=owner, name="Stale", unit=unit)
+        foreign = Habit.objects.create(user=other, name="Foreign", unit=unit)
+        for habit, offsets in ((recent, range(5)), (stale, range(40, 43)), (foreign, range(5))):
+            for offset in offsets:
+                HabitLog.objects.create(habit=habit, date=today - datetime.timedelta(days=offset), progress=1)
+        Streak.objects.update(current_streak=99, longest_streak=99)
+
+        call_command(
+            "rebuild_streaks", user=owner.email, since=today - datetime.timedelta(days=10), workers=1, batch_size=2,
+            stdout=StringIO(),
+        )
+        rebuilt = dict(Streak.objects.values_list("habit_id", "current_streak"))
+        self.assertEqual(rebuilt, {recent.pk: 5, stale.pk: 99, foreign.pk: 99})
+
+
+class DashboardQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="dash@example.com", password="secret-pass-123")
+        cls.unit = Unit.objects.create(name="times")
+
+    def setUp(self):
+        cache.clear()
+
+    def add_habits(self, count, days):
+        today = today_date()
+        for i in range(count):
+            habit = Habit.objects.create(user=self.user, name=f"Habit {i}", unit=self.unit, target_per_day=2)
+            for offset in range(days):
+                HabitLog.objects.create(habit=habit, date=today - datetime.timedelta(days=offset), progress=2)
+
+    def test_query_count_does_not_grow_with_habits_or_logs(self):
+        self.add_habits(2, 3)
+        with self.assertNumQueries(4):
+            small = get_dashboard(self.user)
+        self.add_habits(8, 10)
+        with self.assertNumQueries(4):
+            large = get_dashboard(self.user)
+
+        self.assertEqual(small["total_habits"], 2)
+        self.assertEqual(large["total_habits"], 10)
+        self.assertEqual(large["completed_habits_today"], 10)
+        self.assertEqual(large["current_streak"], 10)
+
+    def test_today_log_attached_per_habit(self):
+        self.add_habits(3, 2)
+        context = get_dashboard(self.user)
+        with self.assertNumQueries(0):
+            for habit in context["habits"]:
+                self.assertEqual(habit.today_log.date, today_date())
+                habit.today_log.completion_percentage()
+
+    def test_dashboard_view_renders(self):
+        self.add_habits(2, 2)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("habit:dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["completed_habits_today"], 2)
+
+    def test_cached_dashboard_skips_queries_until_a_log_changes(self):
+        self.add_habits(2, 2)
+        self.client.force_login(self.user)
+        url = reverse("habit:dashboard")
+        self.client.get(url)
+        # Only the session and user lookups remain
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        log = HabitLog.objects.filter(habit__user=self.user, date=today_date()).first()
+        log.progress = 1
+        log.save()
+        response = self.client.get(url)
+        self.assertEqual(response.context["completed_habits_today"], 1)
+
+
+class LogBatchApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="batch@example.com", password="secret-pass-123")
+        cls.habit = Habit.objects.create(
+            user=cls.user, name="Stretch", unit=Unit.objects.create(name="sessions"), target_per_day=2,
+            start_date=today_date() - datetime.timedelta(days=30),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, entries):
+        return self.client.post(reverse("habit:log_batch_api"), json.dumps({"entries": entries}), content_type="application/json")
+
+    def entries(self, *progress):
+        today = today_date()
+        return [
+            {"habit": self.habit.pk, "date": (today - datetime.timedelta(days=offset)).isoformat(), "progress": amount}
+            for offset, amount in enumerate(progress)
+        ]
+
+    def test_batch_upserts_and_updates_derived_state(self):
+        per_log = rewards.points_per_completion()
+        response = self.post(self.entries(2, 2, 2))
+        self.assertEqual(response.json(), {"success": True, "created": 3, "updated": 0, "unchanged": 0})
+        self.assertEqual(Streak.objects.get(habit=self.habit).current_streak, 3)
+        self.assertEqual(User.objects.get(pk=self.user.pk).points, 3 * per_log)
+
+        response = self.post(self.entries(2, 1, 2))
+        self.assertEqual(response.json(), {"success": True, "created": 0, "updated": 1, "unchanged": 2})
+        log = HabitLog.objects.get(habit=self.habit, date=today_date() - datetime.timedelta(days=1))
+        self.assertEqual((log.progress, log.completed, log.status), (1, False, "pending"))
+        self.assertEqual(Streak.objects.get(habit=self.habit).current_streak, 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).points, 2 * per_log)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        other = Habit.objects.create(
+            user=self.user, name="Journal", unit=self.habit.unit, start_date=today_date() - datetime.timedelta(days=30),
+        )
+
+        def backfill(days, offset):
+            entries = [
+                {"habit": habit.pk, "date": (today_date() - datetime.timedelta(days=offset + day)).isoformat(), "progress": 1}
+                for habit in (self.habit, other) for day in range(days)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(entries).json()["created"], len(entries))
+            return len(queries)
+
+        self.assertEqual(backfill(2, 0), backfill(7, 2))
+        self.assertEqual(HabitLog.objects.filter(habit__user=self.user).count(), 18)
+
+    def test_invalid_batch_writes_nothing(self):
+        tomorrow = (today_date() + datetime.timedelta(days=1)).isoformat()
+        entries = self.entries(2, 2) + [{"habit": self.habit.pk, "date": tomorrow, "progress": 3}]
+        response = self.post(entries)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()["errors"]["2"]), {"date", "progress"})
+        self.assertFalse(HabitLog.objects.filter(habit=self.habit).exists())
+
+        stranger = User.objects.create_user(email="stranger@example.com", password="!")
+        theirs = Habit.objects.create(user=stranger, name="Theirs", unit=self.habit.unit)
+        response = self.post(self.entries(1) + [{"habit": theirs.pk, "date": today_date().isoformat(), "progress": 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("1", response.json()["errors"])
+        self.assertFalse(HabitLog.objects.exists())
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="unread@example.com", password="secret-pass-123")
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rolled_back_notifications_leave_the_counter_alone(self):
+        self.assertEqual(unread_count(self.user.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Notification.objects.create(user=self.user, message="Lost")
+                transaction.set_rollback(True)
+            Notification.objects.create(user=self.user, message="Kept")
+        self.assertEqual(unread_count(self.user.pk), 1)
+
+    def test_counter_follows_mark_read_and_delete(self):
+        self.client.force_login(self.user)
+        url = reverse("habit:notification_unread_count")
+        self.assertEqual(self.client.get(url).json(), {"count": 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            notes = [Notification.objects.create(user=self.user, message=f"Note {i}") for i in range(4)]
+        # Served from the counter: only the session and user lookups
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).json(), {"count": 4})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(2):
+                self.client.get(reverse("habit:notification_mark_read", args=[notes[0].pk]))
+            self.client.get(reverse("habit:notification_delete", args=[notes[0].pk]))
+            self.client.get(reverse("habit:notification_delete", args=[notes[1].pk]))
+        self.assertEqual(self.client.get(url).json(), {"count": 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("habit:notification_mark_all_read"))
+        self.assertEqual(self.client.get(url).json(), {"count": 0})
+        self.assertEqual(Notification.objects.filter(user=self.user, is_read=False).count(), unread_count(self.user.pk))
+
+
+@override_settings(NOTIFICATION_BROKER="habit.events.DatabaseBroker")
+@mock.patch.object(events, "POLL_INTERVAL", 0.05)
+class NotificationStreamTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        events.reset_broker()
+        self.addCleanup(events.reset_broker)
+        self.user = User.objects.create_user(email="stream@example.com", password="secret-pass-123")
+
+    def test_events_from_other_processes_reach_the_stream(self):
+        def elsewhere():
+            # A reminder run from a management command, and a broker of
+            # another process that has no streams open itself
+            notify.send([Notification(user_id=self.user.pk, message="Time to stretch")])
+            events.DatabaseBroker().publish(self.user.pk, {"type": "notification", "id": 0, "message": "Hello"})
+
+        async def read():
+            frames = events.stream(self.user.pk)
+            received = [await frames.__anext__()]
+            await sync_to_async(elsewhere, thread_sensitive=False)()
+            for _ in range(2):
+                received.append(await asyncio.wait_for(frames.__anext__(), 5))
+            await frames.aclose()
+            return received
+
+        first, unread, created = async_to_sync(read)()
+        self.assertIn('"count": 0', first)
+        self.assertTrue(unread.startswith("event: unread\n"))
+        self.assertIn('"count": 1', unread)
+        self.assertTrue(created.startswith("event: notification\n"))
+        self.assertIn('"message": "Hello"', created)
+
+
+class NotifySendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(email=f"send{i}@example.com", password="!", username=f"send{i}") for i in range(5)]
+
+    def setUp(self):
+        cache.clear()
+        for user in self.users:
+            unread_count(user.pk)
+
+    def counts(self):
+        return [unread_count(user.pk) for user in self.users]
+
+    def test_skips_unread_duplicates_and_counts_after_commit(self):
+        Notification.objects.create(user=self.users[1], message="Weekly recap")
+        with self.captureOnCommitCallbacks() as callbacks:
+            sent = notify.send(
+                [Notification(user_id=user.pk, message="Weekly recap") for user in self.users + self.users[:1]],
+                batch_size=2,
+            )
+        self.assertEqual(sent, 4)
+        self.assertEqual(Notification.objects.filter(message="Weekly recap").count(), 5)
+        self.assertEqual(self.counts(), [0, 0, 0, 0, 0])  # Nothing moves before the commit
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.counts(), [1, 0, 1, 1, 1])
+
+    def test_failed_chunk_keeps_the_counts_of_committed_ones(self):
+        insert = Notification.objects.bulk_create
+
+        def fail_second_chunk(objs, **kwargs):
+            if any(n.user_id == self.users[2].pk for n in objs):
+                raise IntegrityError("simulated")
+            return insert(objs, **kwargs)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with mock.patch.object(Notification.objects, "bulk_create", side_effect=fail_second_chunk):
+                with self.assertRaises(IntegrityError):
+                    notify.notify_many(self.users, "Challenge updated", batch_size=2)
+        self.assertEqual(self.counts(), [1, 1, 0, 0, 0])
+        self.assertEqual(Notification.objects.filter(message="Challenge updated").count(), 2)
+
+
+class PurgeReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(email=f"purge{i}@example.com", password="!", username=f"purge{i}") for i in range(3)]
+        old = datetime.datetime(2026, 1, 15, 9, 0)
+        for i in range(12):
+            note = Notification.objects.create(user=cls.users[i % 3], message=f"Note {i}", is_read=i % 4 != 0)
+            if i < 9:
+                Notification.objects.filter(pk=note.pk).update(created_at=old + datetime.timedelta(days=i * 10))
+
+    def test_archives_and_deletes_old_read_notifications(self):
+        before = datetime.datetime(2026, 6, 1)
+        purgeable = Notification.objects.filter(is_read=True, created_at__lt=before)
+        expected = {user.pk: purgeable.filter(user=user).count() for user in self.users}
+        chunks = []
+        self.assertEqual(retention.purge_read(before, chunk_size=2, on_chunk=lambda *args: chunks.append(args)), 6)
+
+        self.assertEqual(sum(deleted for deleted, _ in chunks), 6)
+        self.assertFalse(purgeable.exists())
+        self.assertEqual(Notification.objects.count(), 6)
+        for user in self.users:
+            summary = NotificationArchive.objects.get(user=user).summary
+            self.assertEqual(summary["count"], expected[user.pk])
+            self.assertEqual(sum(summary["months"].values()), summary["count"])
+
+    def test_chunk_deletes_without_per_row_signals(self):
+        with CaptureQueriesContext(connection) as queries:
+            retention.purge_read(datetime.datetime(2026, 6, 1), chunk_size=100)
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("DELETE")]), 1)
+        # No rows are loaded for the post_delete receiver
+        self.assertFalse(any('"habit_notification"."message"' in q["sql"] for q in queries))
+
+
+class ReminderDispatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="remind@example.com", password="secret-pass-123", user_timezone="America/New_York",
+        )
+        cls.habit = Habit.objects.create(
+            user=cls.user, name="Stretch", unit=Unit.objects.create(name="times"), start_date=datetime.date(2026, 1, 1),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def sends(self, start, minutes):
+        # Reads each notification right away so a repeat would not be deduped
+        sent = {}
+        for minute in range(minutes):
+            moment = start + datetime.timedelta(minutes=minute)
+            with self.captureOnCommitCallbacks(execute=True):
+                count = reminders.dispatch(moment)
+            if count:
+                sent[moment] = count
+            Notification.objects.update(is_read=True)
+        return sent
+
+    def test_reminder_in_a_skipped_hour_fires_once_after_the_jump(self):
+        Reminder.objects.create(habit=self.habit, time=datetime.time(2, 30))
+        # 01:00 EST to 04:59 EDT on the night the clocks skip 02:00-02:59
+        start = datetime.datetime(2026, 3, 8, 6, 0, tzinfo=datetime.timezone.utc)
+        self.assertEqual(self.sends(start, 180), {datetime.datetime(2026, 3, 8, 7, 0, tzinfo=datetime.timezone.utc): 1})
+
+    def test_reminder_in_a_repeated_hour_fires_on_the_first_pass_only(self):
+        Reminder.objects.create(habit=self.habit, time=datetime.time(1, 30))
+        # 00:00 EDT to 02:59 EST; 01:00-01:59 comes around twice
+        start = datetime.datetime(2026, 11, 1, 4, 0, tzinfo=datetime.timezone.utc)
+        self.assertEqual(self.sends(start, 240), {datetime.datetime(2026, 11, 1, 5, 30, tzinfo=datetime.timezone.utc): 1})
+
+    def test_tick_only_considers_stored_timezones(self):
+        Reminder.objects.create(habit=self.habit, time=datetime.time(9, 0))
+        groups = reminders.local_buckets(
+            datetime.datetime(2026, 6, 1, 13, 0, tzinfo=datetime.timezone.utc), reminders.stored_timezones(),
+        )
+        self.assertEqual(groups, {(540, datetime.date(2026, 6, 1)): ["America/New_York"]})
+
+    def test_save_reads_the_timezone_without_loading_the_habit(self):
+        with self.assertNumQueries(2):
+            reminder = Reminder.objects.create(habit_id=self.habit.pk, time=datetime.time(7, 0))
+        self.assertEqual(reminder.timezone, "America/New_York")
+        habit = Habit.objects.select_related("user").get(pk=self.habit.pk)
+        with self.assertNumQueries(1):
+            Reminder.objects.create(habit=habit, time=datetime.time(8, 0))
+
+
+class RollupTests(TestCase):
+    def rows(self, user):
+        return list(
+            DailyUserSummary.objects.filter(user=user).order_by("date")
+            .values_list("date", "habits_due", "habits_completed", "total_progress")
+        )
+
+    def test_incremental_summaries_match_a_rebuild(self):
+        cache.clear()
+        user = User.objects.create_user(email="rollups@example.com", password="secret-pass-123")
+        unit, today = Unit.objects.create(name="glasses"), today_date()
+        start = today - datetime.timedelta(days=20)
+        water = Habit.objects.create(user=user, name="Water", unit=unit, target_per_day=3, start_date=start)
+        gym = Habit.objects.create(
+            user=user, name="Gym", unit=unit, target_per_day=1, start_date=start,
+            frequency="custom", custom_days={"days": ["Mon", "Thu"]},
+        )
+        day = lambda offset: today - datetime.timedelta(days=offset)
+        logs = [HabitLog.objects.create(habit=water, date=day(offset), progress=offset % 4) for offset in range(10)]
+        for offset in range(0, 10, 3):
+            HabitLog.objects.create(habit=gym, date=day(offset), progress=1)
+
+        logs[1].progress = 0
+        logs[1].save()
+        logs[2].date = day(15)
+        logs[2].save()
+        logs[3].delete()
+        gym.custom_days = {"days": ["Mon", "Tue", "Thu"]}
+        gym.save()
+        Habit.objects.create(user=user, name="Read", unit=unit, start_date=day(5))
+        gym.delete()
+
+        incremental = self.rows(user)
+        rollups.rebuild([user.pk])
+        self.assertEqual(incremental, self.rows(user))
+        self.assertNotIn(day(1), [row[0] for row in incremental])
+
+
+class ChallengeProgressTests(TestCase):
+    def progress(self):
+        return dict(ChallengeProgress.objects.values_list("challenge__name", "completed_days"))
+
+    def test_deleting_a_habit_recomputes_its_challenges(self):
+        cache.clear()
+        user = User.objects.create_user(email="challenger@example.com", password="secret-pass-123")
+        unit, fitness = Unit.objects.create(name="runs"), Category.objects.create(name="Fitness")
+        start = datetime.date(2024, 1, 1)
+        run = Habit.objects.create(user=user, name="Run", unit=unit, category=fitness, start_date=start)
+        read = Habit.objects.create(user=user, name="Read", unit=unit, start_date=start)
+        for name, category in (("Any habit", None), ("Fitness", fitness)):
+            challenge = Challenge.objects.create(
+                name=name, category=category, created_by=user, start_date=start, end_date=datetime.date(2024, 1, 10),
+            )
+            challenge.participants.add(user)
+        for offset in range(4):
+            HabitLog.objects.create(habit=run, date=start + datetime.timedelta(days=offset), progress=1)
+        for offset in range(2, 5):
+            HabitLog.objects.create(habit=read, date=start + datetime.timedelta(days=offset), progress=1)
+        self.assertEqual(self.progress(), {"Any habit": 5, "Fitness": 4})
+
+        run.delete()
+        self.assertEqual(self.progress(), {"Any habit": 3, "Fitness": 0})
+        for challenge in Challenge.objects.all():
+            challenges.recompute(challenge)
+        self.assertEqual(self.progress(), {"Any habit": 3, "Fitness": 0})
+
+
+class KeysetPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="pages@example.com", password="secret-pass-123")
+        habit = Habit.objects.create(user=cls.user, name="Read", unit=Unit.objects.create(name="pages"))
+        today = today_date()
+        HabitLog.objects.bulk_create([
+            HabitLog(habit=habit, date=today - datetime.timedelta(days=offset), progress=1) for offset in range(PAGE_SIZE + 5)
+        ])
+        cls.logs = HabitLog.objects.filter(habit=habit)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_forward_and_back(self):
+        first = keyset_page(self.logs)
+        self.assertEqual(len(first), PAGE_SIZE)
+        self.assertTrue(first.has_next)
+        self.assertFalse(first.has_previous)
+
+        second = keyset_page(self.logs, after=first.next_cursor)
+        self.assertEqual(len(second), 5)
+        self.assertFalse(second.has_next)
+        self.assertTrue(second.has_previous)
+        self.assertLess(second.items[0].date, first.items[-1].date)
+
+        back = keyset_page(self.logs, before=second.previous_cursor)
+        self.assertEqual([log.pk for log in back], [log.pk for log in first])
+        self.assertFalse(back.has_previous)
+
+    def test_before_cursor_with_nothing_newer_gives_first_page(self):
+        page = keyset_page(self.logs, before="9999-12-31.1")
+        self.assertEqual([log.pk for log in page], [log.pk for log in keyset_page(self.logs)])
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("habit:log_list"), {"before": "9999-12-31.1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["logs"]), PAGE_SIZE)
+
+    def test_after_cursor_past_the_end_gives_an_empty_page(self):
+        page = keyset_page(self.logs, after="1900-01-01.1")
+        self.assertEqual(len(page), 0)
+        self.assertFalse(page.has_other_pages())
+        self.assertIsNone(page.next_cursor)
+
+
+class HabitLogWindowTests(TestCase):
+    def test_windows_skip_gaps_in_the_history(self):
+        user = User.objects.create_user(email="window@example.com", password="secret-pass-123")
+        habit = Habit.objects.create(user=user, name="Swim", unit=Unit.objects.create(name="laps"))
+        today = today_date()
+        # Two logs 100 days apart and nothing for the last 60 days
+        for offset in (60, 160):
+            HabitLog.objects.create(habit=habit, date=today - datetime.timedelta(days=offset), progress=1)
+
+        self.client.force_login(user)
+        response = self.client.get(reverse("habit:habit_detail", args=[habit.pk]))
+        self.assertEqual([log.date for log in response.context["logs"]], [today - datetime.timedelta(days=60)])
+        before = response.context["older_before"]
+        self.assertIsNotNone(before)
+
+        data = self.client.get(reverse("habit:habit_logs_more", args=[habit.pk]), {"before": before.isoformat()}).json()
+        self.assertEqual([log["date"] for log in data["logs"]], [(today - datetime.timedelta(days=160)).isoformat()])
+        self.assertIsNone(data["older_before"])
+
+
+class QuickCompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="quick@example.com", password="secret-pass-123", username="quick")
+        cls.habit = Habit.objects.create(user=cls.user, name="Pushups", unit=Unit.objects.create(name="sets"), target_per_day=2)
+        friends = [User.objects.create_user(email=f"pal{i}@example.com", password="!", username=f"pal{i}") for i in range(3)]
+        for friend in friends:
+            social.add(cls.user.pk, friend.pk)
+        cls.friend = friends[0]
+
+    def setUp(self):
+        cache.clear()
+        leaderboard.reset_store()
+        social.reset_cache()
+        self.client.force_login(self.user)
+        self.url = reverse("habit:habit_complete", args=[self.habit.pk])
+
+    def test_tap_writes_the_log_and_defers_the_rest(self):
+        # Session, user and habit, the locked read and the insert of today's
+        # log (four savepoint statements around them) and the streak shown
+        with self.assertNumQueries(10), self.captureOnCommitCallbacks() as deferred:
+            data = self.client.post(self.url).json()
+        self.assertEqual((data["progress"], data["completed"]), (1, False))
+        self.assertEqual(len(deferred), 1)
+        self.assertFalse(Streak.objects.filter(habit=self.habit).exists())
+
+    @override_settings(BACKGROUND_WORKERS=0)
+    def test_deferred_work_catches_up_and_reads_friends_once(self):
+        # A friend's board, built before the taps, has to follow them
+        self.assertEqual(dict(leaderboard.friends_top(self.friend.pk, "streak"))[self.user.pk], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            data = self.client.post(self.url).json()
+        self.assertEqual((data["progress"], data["completed"], data["current_streak"]), (2, True, 1))
+
+        self.assertEqual(sum("habit_friendship" in query["sql"] for query in queries.captured_queries), 1)
+        self.assertEqual(Streak.objects.get(habit=self.habit).current_streak, 1)
+        self.assertEqual(User.objects.get(pk=self.user.pk).points, rewards.points_per_completion())
+        summary = DailyUserSummary.objects.get(user=self.user, date=today_date())
+        self.assertEqual((summary.habits_completed, summary.total_progress), (1, 2))
+        self.assertEqual(TimelineEntry.objects.filter(event__user=self.user, event__kind="completion").count(), 3)
+        self.assertEqual(dict(leaderboard.friends_top(self.friend.pk, "streak"))[self.user.pk], 1)
+
+
+class PointsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="points@example.com", password="secret-pass-123")
+        cls.habit = Habit.objects.create(user=cls.user, name="Walk", unit=Unit.objects.create(name="walks"), target_per_day=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def complete(self, days):
+        today = today_date()
+        return [HabitLog.objects.create(habit=self.habit, date=today - datetime.timedelta(days=offset), progress=1) for offset in range(days)]
+
+    def points(self):
+        return User.objects.get(pk=self.user.pk).points
+
+    def test_spent_points_are_not_paid_out_again(self):
+        logs = self.complete(3)
+        per_log = rewards.points_per_completion()
+        reward = Reward.objects.create(user=self.user, title="Cake", points_required=3 * per_log)
+        rewards.claim(User.objects.get(pk=self.user.pk), reward)
+        self.assertEqual(self.points(), 0)
+
+        for log in logs:
+            log.progress = 0
+            log.save()
+        self.assertEqual(self.points(), -3 * per_log)
+        for log in logs:
+            log.progress = 1
+            log.save()
+        self.assertEqual(self.points(), 0)
+        self.assertEqual(rewards.expected_points([self.user.pk]), {self.user.pk: 0})
+        self.assertEqual(rewards.reconcile()[1], 0)
+
+    def test_award_and_reconcile_grant_the_same_badges(self):
+        free = Badge.objects.create(name="Welcome", description="", points_required=0)
+        first = Badge.objects.create(name="First", description="", points_required=rewards.points_per_completion())
+        Badge.objects.create(name="Far", description="", points_required=1000)
+        self.complete(1)
+        owned = set(UserBadge.objects.filter(user=self.user).values_list("badge_id", flat=True))
+        self.assertEqual(owned, {free.pk, first.pk})
+        self.assertEqual(rewards.reconcile()[2], 0)
+
+
+class FriendGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = {
+            name: User.objects.create_user(email=f"{name}@example.com", password="!", username=name).pk
+            for name in ("ann", "bob", "cat", "dan", "eve", "fay")
+        }
+        # Added in both directions; each pair is stored as one edge
+        for a, b in (("ann", "bob"), ("cat", "ann"), ("bob", "dan"), ("dan", "cat"), ("cat", "eve"), ("fay", "dan")):
+            social.add(cls.ids[a], cls.ids[b])
+
+    def setUp(self):
+        social.reset_cache()
+
+    def names(self, ids):
+        return {name for name, pk in self.ids.items() if pk in ids}
+
+    def suggested(self, name):
+        return [(user.username, user.mutual_count) for user in social.suggestions(self.ids[name])]
+
+    def test_neighbors_and_suggestions(self):
+        self.assertEqual(Friendship.objects.count(), 6)
+        self.assertEqual(self.names(social.neighbors(self.ids["ann"])), {"bob", "cat"})
+        self.assertEqual(self.names(social.neighbors(self.ids["dan"])), {"bob", "cat", "fay"})
+        self.assertEqual(self.names(social.mutual(self.ids["ann"], self.ids["dan"])), {"bob", "cat"})
+        self.assertEqual(self.suggested("ann"), [("dan", 2), ("eve", 1)])
+        self.assertEqual(self.suggested("fay"), [("bob", 1), ("cat", 1)])
+        self.assertEqual(social.suggestions(User.objects.create_user(email="new@example.com", password="!").pk), [])
+
+    @override_settings(FRIEND_GRAPH_CACHE_SIZE=10)
+    def test_cached_neighbors_follow_edge_changes(self):
+        ann = self.ids["ann"]
+        social.neighbors(ann)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(social.neighbors(ann)), {"bob", "cat"})
+        social.add(ann, self.ids["eve"])
+        self.assertEqual(self.names(social.neighbors(ann)), {"bob", "cat", "eve"})
+        self.assertEqual(self.suggested("ann"), [("dan", 2)])
+        self.assertTrue(social.remove(self.ids["bob"], ann))
+        self.assertEqual(self.names(social.neighbors(ann)), {"cat", "eve"})
+        self.assertEqual(self.suggested("ann"), [("dan", 1)])
+
+
+@override_settings(BACKGROUND_WORKERS=0)
+class ActivityFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, *cls.friends, cls.stranger = [
+            User.objects.create_user(email=f"feed{i}@example.com", password="!", username=f"feed{i}") for i in range(4)
+        ]
+        for friend in cls.friends:
+            social.add(cls.author.pk, friend.pk)
+        cls.habit = Habit.objects.create(user=cls.author, name="Swim", unit=Unit.objects.create(name="laps"))
+
+    def setUp(self):
+        cache.clear()
+        social.reset_cache()
+        leaderboard.reset_store()
+
+    def record(self, days):
+        today = today_date()
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                activity.record(self.author.pk, "completion", today - datetime.timedelta(days=offset), habit_id=self.habit.pk)
+                for offset in range(days)
+            ]
+
+    def test_completion_reaches_friends_after_commit(self):
+        with self.captureOnCommitCallbacks() as deferred:
+            HabitLog.objects.create(habit=self.habit, date=today_date(), progress=1)
+        self.assertFalse(TimelineEntry.objects.exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            for callback in deferred:
+                callback()
+        for friend in self.friends:
+            self.assertEqual([event.kind for event in activity.feed(friend.pk)[0]], ["completion"])
+        self.assertEqual(activity.feed(self.stranger.pk)[0], [])
+
+    def test_trim_then_prune_unreferenced_events(self):
+        events = self.record(5)
+        self.assertEqual(activity.trim(size=2), 6)
+        # Too recent: their fan-out might still be queued
+        self.assertEqual(activity.prune_events(size=2), 0)
+
+        ActivityEvent.objects.update(created_at=now() - activity.PRUNE_GRACE - datetime.timedelta(minutes=1))
+        self.assertEqual(activity.prune_events(size=2), 3)
+        kept = [event.pk for event in events[-2:]]
+        self.assertEqual(sorted(ActivityEvent.objects.values_list("id", flat=True)), sorted(kept))
+        self.assertEqual([event.pk for event in activity.feed(self.friends[0].pk)[0]], sorted(kept, reverse=True))
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_prune_caps_pulled_events(self):
+        events = self.record(4)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(activity.prune_events(size=3), 1)
+        self.assertFalse(ActivityEvent.objects.filter(pk=events[0].pk).exists())
+        self.assertEqual(len(activity.feed(self.friends[1].pk)[0]), 3)
+
+
+class RewardClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="claims@example.com", password="secret-pass-123")
+        User.objects.filter(pk=cls.user.pk).update(points=50)
+        cls.cake = Reward.objects.create(user=cls.user, title="Cake", points_required=30)
+        cls.movie = Reward.objects.create(user=cls.user, title="Movie", points_required=30)
+
+    def test_claims_from_stale_copies_cannot_double_spend(self):
+        # Two requests that both loaded the user and rewards before either claimed
+        first, second = User.objects.get(pk=self.user.pk), User.objects.get(pk=self.user.pk)
+        cake_again = Reward.objects.get(pk=self.cake.pk)
+        rewards.claim(first, self.cake)
+        with self.assertRaisesMessage(rewards.ClaimError, "already been claimed"):
+            rewards.claim(second, cake_again)
+        with self.assertRaisesMessage(rewards.ClaimError, "Not enough points"):
+            rewards.claim(second, self.movie)
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).points, 20)
+        self.assertEqual(list(Reward.objects.filter(is_claimed=True).values_list("title", flat=True)), ["Cake"])
+        self.assertEqual(list(RewardClaim.objects.values_list("title", "points_spent")), [("Cake", 30)])
+
+
+class LeaderboardStoreTests(TestCase):
+    def test_local_store_matches_a_sorted_list(self):
+        store, scores = leaderboard.LocalSortedSets(), {}
+        for step in range(3000):
+            member, score = step * 7 % 101, step * 13 % 37
+            if step % 4 == 3:
+                store.zrem("board", member)
+                scores.pop(member, None)
+            else:
+                store.zadd("board", {member: score})
+                scores[member] = score
+        expected = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        self.assertEqual(store.zrevrange("board", 0, -1, withscores=True), expected)
+        self.assertEqual(store.zrevrange("board", 5, 9), [member for member, _ in expected[5:10]])
+        self.assertEqual([store.zrevrank("board", member) for member, _ in expected], list(range(len(expected))))
+        self.assertEqual(store.zcard("board"), len(expected))
+        self.assertIsNone(store.zrevrank("board", 1000))
+
+
+class ValidatedSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email="valid@example.com", password="secret-pass-123", username="valid")
+        cls.habit = Habit.objects.create(user=cls.user, name="Plank", unit=Unit.objects.create(name="minutes"), target_per_day=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_duplicate_email_fails_validation(self):
+        with self.assertRaises(ValidationError) as raised:
+            User.objects.create_user(email="valid@example.com", password="secret-pass-123", username="other")
+        self.assertIn("email", raised.exception.message_dict)
+        self.assertEqual(User.objects.filter(email="valid@example.com").count(), 1)
+
+    def test_validated_save_checks_fields_but_leaves_uniqueness_to_the_database(self):
+        with self.assertRaises(ValidationError):
+            HabitLog(habit=self.habit, date=datetime.date(2026, 1, 1), progress=5).save()
+        with CaptureQueriesContext(connection) as queries:
+            HabitLog(habit=self.habit, date=datetime.date(2026, 1, 1), progress=2).save()
+        # No (habit, date) lookup or habit load before the insert
+        self.assertTrue(queries[0]["sql"].startswith("INSERT"))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            HabitLog(habit=self.habit, date=datetime.date(2026, 1, 1), progress=1).save()
+
+    def test_unvalidated_save_skips_the_checks(self):
+        log = HabitLog(habit=self.habit, date=datetime.date(2026, 1, 2), progress=5)
+        with mock.patch.object(HabitLog, "full_clean") as full_clean:
+            log.save(validate=False)
+        full_clean.assert_not_called()
+        self.assertEqual(HabitLog.objects.get(pk=log.pk).progress, 5)
+
+
+# -----------------------------
+# View benchmarks
+# -----------------------------
+# Every named route is requested against a heavy account and must stay
+# within its query budget. Wall time depends on the machine, so it is only
+# asserted when HABIT_BENCH_TIME_SCALE is set (1 on the reference machine,
+# higher on slower ones). Run just these with
+#   HABIT_DATABASE=sqlite python manage.py test habit --tag benchmark
+# (or against MySQL with the default settings), or leave them out with
+# --exclude-tag benchmark; HABIT_BENCH_REPORT=1 prints the numbers for every
+# route.
+BENCH_HABITS = 50
+BENCH_DAYS = 3 * 365
+BENCH_FRIENDS = 300
+BENCH_NOTIFICATIONS = 5000
+BENCH_EVENTS = 2000
+
+# Seconds per request unless the route sets its own
+TIME_BUDGET = 0.5
+
+
+def time_scale():
+    """
+    The HABIT_BENCH_TIME_SCALE multiplier, or None when time budgets are
+    only reported.
+    """
+    scale = os.environ.get("HABIT_BENCH_TIME_SCALE")
+    return float(scale) if scale else None
+
+
+@tag("benchmark")
+class ViewBenchmarkTests(TestCase):
+    # Public pages are measured logged out, as their visitors see them
+    ANONYMOUS = {"login", "register", "password_reset", "password_reset_done", "password_reset_confirm", "password_reset_complete"}
+
+    @classmethod
+    def setUpTestData(cls):
+        today = today_date()
+        unit = Unit.objects.create(name="minutes")
+        category = Category.objects.create(name="Health")
+        cls.user = User.objects.create_user(email="bench@example.com", password="secret-pass-123", username="bench")
+
+        # Friends, friends of friends and strangers; bulk_create skips the
+        # password hashing and signals of create_user()
+        User.objects.bulk_create(
+            [User(email=f"friend{i}@example.com", username=f"friend{i}", password="!", points=i * 7) for i in range(BENCH_FRIENDS)]
+            + [User(email=f"other{i}@example.com", username=f"other{i}", password="!", points=i) for i in range(BENCH_FRIENDS // 2)],
+        )
+        friends = list(User.objects.filter(username__startswith="friend").order_by("id").values_list("id", flat=True))
+        others = list(User.objects.filter(username__startswith="other").order_by("id").values_list("id", flat=True))
+        edges = {Friendship.edge(cls.user.pk, friend_id) for friend_id in friends}
+        edges |= {Friendship.edge(other_id, friends[(i * 3 + k) % len(friends)]) for i, other_id in enumerate(others) for k in range(3)}
+        Friendship.objects.bulk_create([Friendship(user_id=a, friend_id=b) for a, b in sorted(edges)])
+        FriendRequest.objects.bulk_create([FriendRequest(from_user_id=other_id, to_user=cls.user) for other_id in others[:20]])
+        cls.stranger = User.objects.get(pk=others[-1])
+        cls.friend_ids = friends
+
+        # 50 habits with three years of daily logs; every seventh day falls
+        # short and the last ten habits are not logged yet today
+        Habit.objects.bulk_create([
+            Habit(
+                user=cls.user, name=f"Habit {i}", unit=unit, category=category if i % 2 else None, target_per_day=2,
+                start_date=today - datetime.timedelta(days=BENCH_DAYS),
+            )
+            for i in range(BENCH_HABITS)
+        ])
+        habits = list(Habit.objects.filter(user=cls.user).order_by("id"))
+        logs = []
+        for i, habit in enumerate(habits):
+            for offset in range(1 if i >= BENCH_HABITS - 10 else 0, BENCH_DAYS):
+                progress = 1 if (offset + i) % 7 == 6 else 2
+                logs.append(HabitLog(
+                    habit=habit, date=today - datetime.timedelta(days=offset), progress=progress,
+                    completed=progress == 2, status="done" if progress == 2 else "pending",
+                ))
+        HabitLog.objects.bulk_create(logs, batch_size=1000)
+        streaks.rebuild([habit.pk for habit in habits])
+        rollups.rebuild([cls.user.pk])
+        years = {log.date.year for log in logs}
+        for habit in habits:
+            heatmap.rebuild(habit, years)
+        cls.habit, cls.unlogged_habit = habits[0], habits[-1]
+        cls.today_log = HabitLog.objects.get(habit=cls.habit, date=today)
+
+        # Friends' activity, already fanned out to the user's timeline
+        Habit.objects.bulk_create([Habit(user_id=friend_id, name="Run", unit=unit) for friend_id in friends[:50]])
+        friend_habits = list(Habit.objects.filter(user_id__in=friends[:50]).order_by("id"))
+        ActivityEvent.objects.bulk_create([
+            ActivityEvent(
+                user_id=friend_habits[i % 50].user_id, kind="completion", habit=friend_habits[i % 50],
+                date=today - datetime.timedelta(days=i // 50),
+            )
+            for i in range(BENCH_EVENTS)
+        ])
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner=cls.user, event_id=event_id) for event_id in ActivityEvent.objects.values_list("id", flat=True)],
+            batch_size=1000,
+        )
+
+        Notification.objects.bulk_create(
+            [Notification(user=cls.user, message=f"Notification {i}", is_read=i % 3 != 0) for i in range(BENCH_NOTIFICATIONS)],
+            batch_size=1000,
+        )
+        cls.notification = Notification.objects.filter(user=cls.user, is_read=False).first()
+
+        User.objects.filter(pk=cls.user.pk).update(points=5000)
+        for points in (100, 500, 1000, 5000, 10000):
+            Badge.objects.create(name=f"Badge {points}", description="", points_required=points)
+        UserBadge.objects.bulk_create([UserBadge(user=cls.user, badge=badge) for badge in Badge.objects.filter(points_required__lte=5000)])
+        Reward.objects.bulk_create([
+            Reward(user=cls.user, title=f"Reward {i}", points_required=(i + 1) * 250, is_claimed=i < 5) for i in range(30)
+        ])
+        cls.reward = Reward.objects.filter(user=cls.user, is_claimed=False).order_by("points_required").first()
+
+        for i in range(10):
+            challenge = Challenge.objects.create(
+                name=f"Challenge {i}", created_by=cls.user, category=category if i % 2 else None,
+                start_date=today - datetime.timedelta(days=30 * (i + 1)), end_date=today + datetime.timedelta(days=30),
+            )
+            challenge.participants.add(cls.user, *friends[:100])
+        cls.challenge = challenge
+        cls.open_challenge = Challenge.objects.create(
+            name="Open challenge", created_by_id=friends[0], start_date=today - datetime.timedelta(days=90),
+            end_date=today + datetime.timedelta(days=30),
+        )
+        cls.open_challenge.participants.add(*friends[:100])
+
+    def setUp(self):
+        cache.clear()
+
+    def routes(self):
+        """
+        (name, kwargs, method, data, query budget, time budget) for every
+        named route; a time budget of None means TIME_BUDGET.
+        """
+        friendship = Friendship.objects.filter(Q(user=self.user) | Q(friend=self.user)).order_by("pk").first()
+        friend_request = FriendRequest.objects.filter(to_user=self.user).order_by("pk").first()
+        user = User.objects.get(pk=self.user.pk)
+        uid, token = urlsafe_base64_encode(force_bytes(user.pk)), default_token_generator.make_token(user)
+        batch = json.dumps({"entries": [
+            {"habit": habit_id, "date": (today_date() - datetime.timedelta(days=offset)).isoformat(), "progress": offset % 3}
+            for habit_id in (self.habit.pk, self.unlogged_habit.pk) for offset in range(7)
+        ]})
+        return [
+            ("dashboard", {}, "get", None, 9, None),
+            ("profile", {}, "get", None, 4, None),
+            ("edit_profile", {}, "get", None, 4, None),
+            ("login", {}, "get", None, 1, None),
+            ("logout", {}, "get", None, 5, None),
+            ("register", {}, "get", None, 1, None),
+            ("password_change", {}, "get", None, 4, None),
+            ("password_reset", {}, "get", None, 1, None),
+            ("password_reset_done", {}, "get", None, 1, None),
+            ("password_reset_confirm", {"uidb64": uid, "token": token}, "get", None, 6, None),
+            ("password_reset_complete", {}, "get", None, 1, None),
+            ("friends", {}, "get", None, 10, None),
+            ("friend_request_send", {}, "post", {"email": self.stranger.email}, 10, None),
+            ("friend_request_accept", {"pk": friend_request.pk}, "post", None, 13, None),
+            ("friend_request_reject", {"pk": friend_request.pk}, "post", None, 6, None),
+            ("friend_remove", {"pk": friendship.pk}, "post", None, 8, None),
+            ("activity_feed", {}, "get", None, 8, None),
+            ("notifications", {}, "get", None, 6, None),
+            ("notification_mark_read", {"pk": self.notification.pk}, "get", None, 5, None),
+            ("notification_mark_all_read", {}, "get", None, 4, None),
+            ("notification_delete", {"pk": self.notification.pk}, "get", None, 5, None),
+            ("notification_unread_count", {}, "get", None, 4, None),
+            ("notification_stream", {}, "get", None, 1, None),
+            ("rewards", {}, "get", None, 8, None),
+            ("reward_add", {}, "post", {"title": "Cinema", "description": "", "points_required": 800}, 4, None),
+            ("reward_claim", {"pk": self.reward.pk}, "post", None, 11, None),
+            ("streaks", {}, "get", None, 6, None),
+            ("habit_add", {}, "get", None, 6, None),
+            ("habit_list", {}, "get", None, 5, None),
+            ("habit_detail", {"pk": self.habit.pk}, "get", None, 7, None),
+            ("habit_calendar", {"pk": self.habit.pk, "year": today_date().year}, "get", None, 6, None),
+            ("habit_logs_more", {"pk": self.habit.pk}, "get", {"before": (today_date() - datetime.timedelta(days=30)).isoformat()}, 6, None),
+            ("habit_complete", {"pk": self.unlogged_habit.pk}, "post", None, 11, None),
+            ("habit_filter", {"st": "active"}, "get", None, 5, None),
+            ("habit_create", {}, "get", None, 5, None),
+            ("habit_edit", {"pk": self.habit.pk}, "get", None, 7, None),
+            ("habit_delete", {"pk": self.habit.pk}, "post", None, 67, None),
+            ("challenge_list", {}, "get", None, 5, None),
+            ("challenge_create", {}, "get", None, 5, None),
+            ("challenge_detail", {"pk": self.challenge.pk}, "get", None, 8, None),
+            ("challenge_edit", {"pk": self.challenge.pk}, "get", None, 6, None),
+            ("challenge_delete", {"pk": self.challenge.pk}, "post", None, 10, None),
+            ("challenge_join", {"pk": self.open_challenge.pk}, "post", None, 14, None),
+            ("challenge_leave", {"pk": self.challenge.pk}, "post", None, 9, None),
+            ("leaderboard_challenge", {"pk": self.challenge.pk}, "get", None, 6, None),
+            ("leaderboard_friends", {"metric": "points"}, "get", None, 6, None),
+            ("log_list", {}, "get", None, 6, None),
+            ("log_add", {"habit_id": self.unlogged_habit.pk}, "get", None, 6, None),
+            ("log_edit", {"pk": self.today_log.pk}, "get", None, 6, None),
+            ("log_grid", {}, "get", None, 6, None),
+            ("log_batch_api", {}, "post", batch, 115, None),
+        ]
+
+    def measure(self, name, kwargs, method, data):
+        """
+        Request one route on a cold cache and return (response, queries,
+        db seconds, wall seconds). Its writes are rolled back.
+        """
+        cache.clear()
+        leaderboard.reset_store()
+        social.reset_cache()
+        with transaction.atomic():
+            self.client.logout()
+            if name not in self.ANONYMOUS:
+                self.client.force_login(self.user)
+            url = reverse(f"habit:{name}", kwargs=kwargs)
+            extra = {"content_type": "application/json"} if isinstance(data, str) else {}
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = getattr(self.client, method)(url, data, **extra)
+                wall = time.perf_counter() - started
+            transaction.set_rollback(True)
+        return response, queries.captured_queries, sum(float(query["time"]) for query in queries.captured_queries), wall
+
+    @override_settings(BACKGROUND_WORKERS=0)
+    def test_quick_complete_deferred_work_stays_within_budget(self):
+        # habit_complete hands its derived updates to the background pool;
+        # run them inline and count them too, with the friends boards built
+        for owner_id in (self.user.pk, *self.friend_ids[:20]):
+            for metric in leaderboard.METRICS:
+                leaderboard.friends_top(owner_id, metric)
+        self.client.force_login(self.user)
+        url = reverse("habit:habit_complete", args=[self.unlogged_habit.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.client.post(url).json()["completed"])
+        friend_reads = [query for query in queries.captured_queries if "habit_friendship" in query["sql"]]
+        self.assertEqual(len(friend_reads), 1)
+        self.assertLessEqual(len(queries), 38, "\n".join(query["sql"][:200] for query in queries.captured_queries))
+
+    def test_every_named_route_is_benchmarked(self):
+        names = {pattern.name for pattern in urlpatterns if pattern.name}
+        self.assertEqual({route[0] for route in self.routes()}, names)
+
+    def test_views_stay_within_budget(self):
+        scale, rows, over = time_scale(), [], []
+        for name, kwargs, method, data, max_queries, max_seconds in self.routes():
+            response, queries, db_time, wall = self.measure(name, kwargs, method, data)
+            self.assertLess(response.status_code, 400, f"{name} answered {response.status_code}")
+            budget = (max_seconds or TIME_BUDGET) * (scale or 1)
+            rows.append(f"{name:<28} {len(queries):>6} {max_queries:>6} {db_time * 1000:>9.1f} {wall * 1000:>9.1f} {budget * 1000:>9.0f}")
+            if len(queries) > max_queries or (scale is not None and wall > budget):
+                over.append((name, rows[-1], queries))
+
+        report = "\n".join([f"{'route':<28} {'sql':>6} {'max':>6} {'db ms':>9} {'wall ms':>9} {'max ms':>9}", *rows])
+        if os.environ.get("HABIT_BENCH_REPORT"):
+            print(f"\n{connection.vendor}\n{report}")
+        if over:
+            details = "\n\n".join(
+                f"{row}\n" + "\n".join(query["sql"][:200] for query in queries[:20]) for name, row, queries in over
+            )
+            self.fail(f"{len(over)} views over budget:\n{details}")
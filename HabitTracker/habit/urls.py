@@ -32,6 +32,7 @@ urlpatterns = [
     path('friends/accept/<int:pk>/', views.friend_request_accept, name='friend_request_accept'),
     path('friends/reject/<int:pk>/', views.friend_request_reject, name='friend_request_reject'),
     path('friends/remove/<int:pk>/', views.friend_remove, name='friend_remove'),
+    path('feed/', views.activity_feed, name='activity_feed'),
 
     # -----------------------------
     # NOTIFICATIONS
@@ -40,6 +41,8 @@ urlpatterns = [
     path('notifications/mark-read/<int:pk>/', views.notification_mark_read, name='notification_mark_read'),
     path('notifications/mark-all-read/', views.notification_mark_all_read, name='notification_mark_all_read'),
     path('notifications/delete/<int:pk>/', views.notification_delete, name='notification_delete'),
+    path('api/notifications/unread-count/', views.notification_unread_count, name='notification_unread_count'),  # Polled by script.js
+    path('api/notifications/stream/', views.notification_stream, name='notification_stream'),
 
     # -----------------------------
     # REWARDS
@@ -55,6 +58,9 @@ urlpatterns = [
     path('habit/add/', views.habit_add, name='habit_add'),
     path('habits/', views.habit_list, name='habit_list'),
     path('habit/<int:pk>/', views.habit_detail, name='habit_detail'),
+    path('habit/<int:pk>/calendar/<int:year>/', views.habit_calendar, name='habit_calendar'),
+    path('habit/<int:pk>/logs/', views.habit_logs_more, name='habit_logs_more'),
+    path('habits/<int:pk>/complete/', views.habit_complete, name='habit_complete'),  # Used by script.js
     path('habit/<str:st>/', views.habit_list, name='habit_filter'),
     path('habit/create/', views.habit_create, name='habit_create'),
     path('habit/<int:pk>/edit/', views.habit_edit, name='habit_edit'),
@@ -68,6 +74,10 @@ urlpatterns = [
     path('challenge/<int:pk>/', views.challenge_detail, name='challenge_detail'),
     path('challenge/<int:pk>/edit/', views.challenge_edit, name='challenge_edit'),
     path('challenge/<int:pk>/delete/', views.challenge_delete, name='challenge_delete'),
+    path('challenge/<int:pk>/join/', views.challenge_join, name='challenge_join'),
+    path('challenge/<int:pk>/leave/', views.challenge_leave, name='challenge_leave'),
+    path('api/leaderboard/challenge/<int:pk>/', views.leaderboard_challenge, name='leaderboard_challenge'),
+    path('api/leaderboard/friends/<str:metric>/', views.leaderboard_friends, name='leaderboard_friends'),
 
     # -----------------------------
     # HABIT LOGS
@@ -76,6 +86,8 @@ urlpatterns = [
     path('logs/add/', views.log_add, name='log_add'),
     path("logs/add/<int:habit_id>/", views.log_add, name="log_add"),
     path("log/<int:pk>/edit/", views.log_edit, name="log_edit"),
+    path('logs/grid/', views.log_grid, name='log_grid'),
+    path('api/logs/batch/', views.log_batch_api, name='log_batch_api'),
 
 
 ]
@@ -5,20 +5,32 @@ from django.contrib import messages
 from django.urls import reverse, reverse_lazy
 from django.core.paginator import Paginator
 from django.utils import timezone
-from django.http import HttpResponseRedirect, HttpResponse
-from django.db.models import Q
+from django.http import HttpResponseRedirect, HttpResponse, JsonResponse, Http404, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q, F, Value, FloatField, ExpressionWrapper, Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Greatest
 from django import forms
 from django.utils.timezone import now
+from django.utils import dateformat
 import datetime
+import json
 
 from .models import (
-    User, Habit, Streak, Reward, Badge, Friendship,
-    FriendRequest, Notification, Challenge, HabitLog
+    User, Habit, Streak, Reward, Badge, UserBadge, Friendship,
+    FriendRequest, Notification, Challenge, ChallengeProgress, HabitLog
 )
+from . import activity, batchlog, events, heatmap, leaderboard, social
+from . import rewards as rewards_engine
+from .quicklog import log_progress
+from .streaks import alive_q, projected
+from .cache import adjust_unread, unread_count as get_unread_count
+from .dashboard import get_cached_dashboard
 from .forms import (
     UserLoginForm, PasswordChangeForm, PasswordResetForm,UserRegisterForm,UserProfileForm,
-    SetPasswordForm, HabitForm, RewardForm, FriendRequestForm, ChallengeForm, HabitLogForm,
+    SetPasswordForm, HabitForm, RewardForm, ChallengeForm, HabitLogForm,
+    HabitLogFilterForm,
 )
+from .pagination import keyset_page
 
 # -----------------------------
 # DASHBOARD
@@ -30,17 +42,8 @@ def dashboard(request):
     """
     if request.user.is_authenticated:
 
-        current_user = request.user
-        # Example context, adapt according to your models
-        context = {
-            'total_habits': Habit.objects.filter(user=current_user).count(),
-            'habits': Habit.objects.filter(user=current_user).filter(status='progressing'),
-            'active_streaks': Streak.objects.filter(user=current_user, is_active=True).count(),
-            'total_points': current_user.points,
-            'recent_logs': HabitLog.objects.all().order_by('-date')[:5],
-            'rewards': Reward.objects.filter(user=current_user),
-            'today': today_date()
-        }
+        # Cached per user; signals invalidate it whenever the stats change
+        context = get_cached_dashboard(request.user, today_date())
         return render(request, 'habit/dashboard.html', context)
     
     return redirect('habit:login')
@@ -136,38 +139,42 @@ def register(request):
 # -----------------------------
 @login_required
 def friends(request):
-    friends = Friendship.objects.filter(user=request.user)
-    friend_requests = FriendRequest.objects.filter(to_user=request.user)
+    friends = social.friendships(request.user.pk)
+    friend_requests = FriendRequest.objects.filter(to_user=request.user).select_related('from_user')
     return render(request, 'habit/friends.html', {
         'friends': friends,
-        'friend_requests': friend_requests
+        'friend_requests': friend_requests,
+        'suggestions': social.suggestions(request.user.pk, limit=5, friends={row.other.pk for row in friends}),
     })
 
 @login_required
 def friend_request_send(request):
+    # The friends page posts a bare ``email`` field, so there is no form to
+    # validate; FriendRequestForm expects ``to_user_email`` and a from_user.
     if request.method == 'POST':
-        form = FriendRequestForm(request.POST)
-        if form.is_valid():
-            email = form.cleaned_data['email']
-            try:
-                to_user = User.objects.get(email=email)
-                if to_user != request.user:
-                    FriendRequest.objects.get_or_create(from_user=request.user, to_user=to_user)
-                    messages.success(request, f"Friend request sent to {to_user.username}")
-                else:
-                    messages.error(request, "You cannot send a request to yourself.")
-            except User.DoesNotExist:
-                messages.error(request, "User with this email does not exist.")
-            return redirect('habit:friends')
-    else:
-        form = FriendRequestForm()
-    return render(request, 'habit/friends.html', {'form': form})
+        email = request.POST.get('email', '').strip()
+        try:
+            to_user = User.objects.get(email=email)
+            if to_user == request.user:
+                messages.error(request, "You cannot send a request to yourself.")
+            elif social.are_friends(request.user.pk, to_user.pk):
+                messages.info(request, f"You are already friends with {to_user.username}")
+            elif FriendRequest.objects.filter(from_user=to_user, to_user=request.user).exists():
+                # They already asked: sending one back accepts theirs
+                social.add(request.user.pk, to_user.pk)
+                FriendRequest.objects.filter(from_user=to_user, to_user=request.user).delete()
+                messages.success(request, f"You are now friends with {to_user.username}")
+            else:
+                FriendRequest.objects.get_or_create(from_user=request.user, to_user=to_user)
+                messages.success(request, f"Friend request sent to {to_user.username}")
+        except User.DoesNotExist:
+            messages.error(request, "User with this email does not exist.")
+    return redirect('habit:friends')
 
 @login_required
 def friend_request_accept(request, pk):
     fr = get_object_or_404(FriendRequest, pk=pk, to_user=request.user)
-    Friendship.objects.get_or_create(user=request.user, friend=fr.from_user)
-    Friendship.objects.get_or_create(user=fr.from_user, friend=request.user)
+    social.add(request.user.pk, fr.from_user_id)
     fr.delete()
     messages.success(request, f"You are now friends with {fr.from_user.username}")
     return redirect('habit:friends')
@@ -181,12 +188,32 @@ def friend_request_reject(request, pk):
 
 @login_required
 def friend_remove(request, pk):
-    friendship = get_object_or_404(Friendship, pk=pk, user=request.user)
-    friendship.friendship_reverse().delete()  # Remove both sides
-    friendship.delete()
-    messages.info(request, f"{friendship.friend.username} removed from friends")
+    if request.method != 'POST':
+        return redirect('habit:friends')
+    friendship = get_object_or_404(
+        Friendship.objects.select_related('user', 'friend'),
+        Q(user=request.user) | Q(friend=request.user), pk=pk,
+    )
+    other = friendship.friend if friendship.user_id == request.user.pk else friendship.user
+    friendship.delete()  # One row per pair, so this ends it for both sides
+    messages.info(request, f"{other.username} removed from friends")
     return redirect('habit:friends')
 
+@login_required
+def activity_feed(request):
+    """
+    Friends' recent activity, newest first, paged with ?before=<event id>.
+    """
+    try:
+        before = int(request.GET['before'])
+    except (KeyError, ValueError):
+        before = None
+    feed_events, next_before = activity.feed(request.user.pk, before)
+    return render(request, 'habit/feed.html', {
+        'feed_events': feed_events,
+        'next_before': next_before,
+    })
+
 
 # -----------------------------
 # NOTIFICATIONS VIEWS
@@ -197,7 +224,7 @@ def notifications(request):
     paginator = Paginator(notifications_list, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
-    unread_count = notifications_list.filter(is_read=False).count()
+    unread_count = get_unread_count(request.user.pk)
     return render(request, 'habit/notifications.html', {
         'notifications': page_obj,
         'unread_count': unread_count
@@ -205,14 +232,19 @@ def notifications(request):
 
 @login_required
 def notification_mark_read(request, pk):
-    notif = get_object_or_404(Notification, pk=pk, user=request.user)
-    notif.is_read = True
-    notif.save()
+    notif = get_object_or_404(Notification.objects.only('id'), pk=pk, user=request.user)
+    # Conditional so a repeated click never decrements the counter twice
+    if Notification.objects.filter(pk=notif.pk, is_read=False).update(is_read=True):
+        adjust_unread(request.user.pk, -1)
+        events.unread_changed(request.user.pk)
     return redirect('habit:notifications')
 
 @login_required
 def notification_mark_all_read(request):
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    marked = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    if marked:
+        adjust_unread(request.user.pk, -marked)
+        events.unread_changed(request.user.pk)
     return redirect('habit:notifications')
 
 @login_required
@@ -221,26 +253,68 @@ def notification_delete(request, pk):
     notif.delete()
     return redirect('habit:notifications')
 
+def notification_unread_count(request):
+    """
+    Polled by script.js; served from the cached counter only.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'count': 0})
+    return JsonResponse({'count': get_unread_count(request.user.pk)})
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of notification and unread-count events.
+    Needs an ASGI server (asgi.py); under WSGI it answers 204 so the client
+    stops reconnecting and falls back to polling notification_unread_count.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=204)
+    return StreamingHttpResponse(
+        events.stream(user.pk),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
 
 # -----------------------------
 # REWARDS VIEWS
 # -----------------------------
 @login_required
 def rewards(request):
-    available_rewards_list = Reward.objects.filter(active=True).order_by('points_required')
-    claimed_rewards_list = Reward.objects.filter(claimed_by=request.user).order_by('-claimed_at')
-    badges = Badge.objects.all()
-    user_badges = request.user.badges.all()
+    points = request.user.points
+    user_rewards = Reward.objects.filter(user=request.user)
+    stats = user_rewards.aggregate(
+        total_rewards=Count('id'),
+        claimed_rewards=Count('id', filter=Q(is_claimed=True)),
+        available_rewards=Count('id', filter=Q(is_claimed=False)),
+        total_points_spent=Sum('points_required', filter=Q(is_claimed=True)),
+    )
+    # Both lists from one query, split in Python
+    reward_list = user_rewards.annotate(
+        claimed_at=F('claim__claimed_at'),
+        points_needed=Greatest(F('points_required') - points, 0),
+    ).order_by('points_required', 'pk')
+    available_rewards_list = [r for r in reward_list if not r.is_claimed]
+    claimed_rewards_list = sorted(
+        (r for r in reward_list if r.is_claimed), key=lambda r: r.claimed_at or r.created_at, reverse=True,
+    )
+
+    earned = {ub.badge_id: ub for ub in UserBadge.objects.filter(user=request.user).select_related('badge')}
+    badges = list(Badge.objects.order_by('points_required', 'pk'))
+    for badge in badges:
+        badge.earned_date = earned[badge.pk].awarded_at if badge.pk in earned else None
+        badge.points_needed = max(badge.points_required - points, 0)
     return render(request, 'habit/rewards.html', {
+        **stats,
+        'total_points_spent': stats['total_points_spent'] or 0,
         'available_rewards_list': available_rewards_list,
         'claimed_rewards_list': claimed_rewards_list,
         'badges': badges,
-        'user_badges': user_badges,
+        'user_badges': [ub.badge for ub in earned.values()],
         'user': request.user,
-        'total_rewards': Reward.objects.count(),
-        'claimed_rewards': claimed_rewards_list.count(),
-        'available_rewards': available_rewards_list.count(),
-        'total_points_spent': claimed_rewards_list.aggregate(total=models.Sum('points_required'))['total'] or 0
     })
 
 @login_required
@@ -248,7 +322,9 @@ def reward_add(request):
     if request.method == 'POST':
         form = RewardForm(request.POST)
         if form.is_valid():
-            form.save()
+            reward = form.save(commit=False)
+            reward.user = request.user
+            reward.save()
             messages.success(request, "Reward created successfully!")
             return redirect('habit:rewards')
     else:
@@ -257,14 +333,13 @@ def reward_add(request):
 
 @login_required
 def reward_claim(request, pk):
-    reward = get_object_or_404(Reward, pk=pk)
-    if request.user.points >= reward.points_required:
-        request.user.points -= reward.points_required
-        request.user.save()
-        reward.claimed_by.add(request.user)
-        messages.success(request, f"You claimed {reward.title}!")
-    else:
-        messages.error(request, "Not enough points to claim this reward.")
+    reward = get_object_or_404(Reward, pk=pk, user=request.user)
+    if request.method == 'POST':
+        try:
+            rewards_engine.claim(request.user, reward)
+            messages.success(request, f"You claimed {reward.title}!")
+        except rewards_engine.ClaimError as e:
+            messages.error(request, str(e))
     return redirect('habit:rewards')
 
 
@@ -273,17 +348,20 @@ def reward_claim(request, pk):
 # -----------------------------
 @login_required
 def streaks(request):
-    streaks_list = Streak.objects.filter(user=request.user).order_by('-current_streak')
-    total_current_streak = sum(s.current_streak for s in streaks_list)
-    max_streak = max((s.longest_streak for s in streaks_list), default=0)
-    active_streaks = streaks_list.filter(is_active=True).count()
-    completion_rate = int((active_streaks / streaks_list.count()) * 100) if streaks_list else 0
+    user_streaks = Streak.objects.filter(user=request.user)
+    stats = user_streaks.aggregate(
+        total=Count('id'),
+        total_current_streak=Sum('current_streak'),
+        max_streak=Max('longest_streak'),
+        active_streaks=Count('id', filter=Q(is_active=True) & alive_q(today_date())),
+    )
+    streaks_list = user_streaks.select_related('habit', 'habit__category').order_by('-current_streak', 'pk')
     return render(request, 'habit/streaks.html', {
         'streaks': streaks_list,
-        'total_current_streak': total_current_streak,
-        'max_streak': max_streak,
-        'active_streaks': active_streaks,
-        'completion_rate': completion_rate
+        'total_current_streak': stats['total_current_streak'] or 0,
+        'max_streak': stats['max_streak'] or 0,
+        'active_streaks': stats['active_streaks'],
+        'completion_rate': stats['active_streaks'] * 100 // stats['total'] if stats['total'] else 0,
     })
 
 
@@ -337,9 +415,52 @@ def habit_list(request, st = "all"):
 
 @login_required
 def habit_detail(request, pk):
-    habit = get_object_or_404(Habit, pk=pk, user=request.user)
+    habit = get_object_or_404(Habit.objects.select_related('unit'), pk=pk, user=request.user)
     streaks = Streak.objects.filter(habit=habit)
-    return render(request, 'habit/habits/habit_detail.html', {'habit': habit, 'streaks': streaks, 'today':today_date()})
+    # Only the most recent window of logs; older ones come from habit_logs_more
+    logs, older_before = habit_log_window(habit, today_date() + datetime.timedelta(days=1))
+    return render(request, 'habit/habits/habit_detail.html', {
+        'habit': habit,
+        'streaks': streaks,
+        'logs': logs,
+        'older_before': older_before,
+        'today': today_date(),
+    })
+
+@login_required
+def habit_logs_more(request, pk):
+    """
+    JSON "load more" for habit_detail: the window of logs before ?before=.
+    """
+    habit = get_object_or_404(Habit.objects.only('id', 'user_id', 'target_per_day'), pk=pk, user=request.user)
+    try:
+        before = datetime.date.fromisoformat(request.GET.get('before', ''))
+    except ValueError:
+        return JsonResponse({'error': 'before must be a YYYY-MM-DD date'}, status=400)
+    logs, older_before = habit_log_window(habit, before)
+    today = today_date()
+    return JsonResponse({
+        'logs': [{
+            'id': log.id,
+            'date': log.date.isoformat(),
+            'date_display': dateformat.format(log.date, "M d, Y"),
+            'progress': log.progress,
+            'completed': log.completed,
+            'percentage': log.percentage,
+            'edit_url': reverse('habit:log_edit', args=[log.id]) if log.date == today else None,
+        } for log in logs],
+        'older_before': older_before.isoformat() if older_before else None,
+    })
+
+@login_required
+def habit_calendar(request, pk, year):
+    """
+    JSON heatmap data for one year of a habit (completion bitmap + progress).
+    """
+    if not 1 <= year <= 9998:
+        raise Http404("Invalid year")
+    habit = get_object_or_404(Habit.objects.only('id', 'user_id', 'target_per_day'), pk=pk, user=request.user)
+    return JsonResponse(heatmap.year_data(habit, year))
 
 
 @login_required
@@ -369,16 +490,49 @@ def habit_delete(request, pk):
 # ==========================
 @login_required
 def challenge_list(request):
-    current_user = User.objects.get(email = request.user.email)
-    # my_challenges = current_user.challenges.all()
-    my_challenges = Challenge.objects.all()
-    all_challenges = Challenge.objects.all()
-    return render(request, 'habit/challenges/challenge_list.html', {'my_challenges': my_challenges, 'all_challenges': all_challenges})
+    # One query; progress is maintained by the challenge engine, not computed here
+    my_progress = ChallengeProgress.objects.filter(challenge=OuterRef('pk'), user=request.user)
+    challenges = list(
+        Challenge.objects.select_related('category')
+        .annotate(
+            my_progress=Subquery(my_progress.values('progress')[:1]),
+            participant_count=Count('participants', distinct=True),
+        )
+        .order_by('-start_date', 'pk')
+    )
+    return render(request, 'habit/challenges/challenge_list.html', {
+        'my_challenges': [c for c in challenges if c.my_progress is not None],
+        'all_challenges': challenges,
+    })
 
 @login_required
 def challenge_detail(request, pk):
-    challenge = get_object_or_404(Challenge, pk=pk, user=request.user)
-    return render(request, 'habit/challenges/challenge_detail.html', {'challenge': challenge})
+    challenge = get_object_or_404(Challenge.objects.select_related('category', 'created_by'), pk=pk)
+    progress = ChallengeProgress.objects.filter(challenge=challenge, user=request.user).first()
+    top = leaderboard.challenge_top(challenge.pk)
+    names = dict(User.objects.filter(id__in=[user_id for user_id, _ in top]).values_list('id', 'username'))
+    return render(request, 'habit/challenges/challenge_detail.html', {
+        'challenge': challenge,
+        'progress': progress,
+        'my_rank': leaderboard.challenge_rank(challenge.pk, request.user.pk) if progress else None,
+        'top': [(i, names.get(user_id), score) for i, (user_id, score) in enumerate(top, 1)],
+    })
+
+@login_required
+def challenge_join(request, pk):
+    challenge = get_object_or_404(Challenge, pk=pk)
+    if request.method == "POST":
+        challenge.participants.add(request.user)  # Progress is computed by the m2m signal
+        messages.success(request, f"You joined {challenge.name}!")
+    return redirect('habit:challenge_detail', pk=challenge.pk)
+
+@login_required
+def challenge_leave(request, pk):
+    challenge = get_object_or_404(Challenge, pk=pk)
+    if request.method == "POST":
+        challenge.participants.remove(request.user)
+        messages.info(request, f"You left {challenge.name}.")
+    return redirect('habit:challenge_list')
 
 @login_required
 def challenge_create(request):
@@ -388,6 +542,7 @@ def challenge_create(request):
             challenge = form.save(commit=False)
             challenge.created_by = request.user 
             challenge.save()
+            challenge.participants.add(request.user)
             messages.success(request, "Challenge created successfully!")
             return redirect('habit:challenge_list')
     else:
@@ -398,7 +553,7 @@ def challenge_create(request):
 
 @login_required
 def challenge_edit(request, pk):
-    challenge = get_object_or_404(Challenge, pk=pk, user=request.user)
+    challenge = get_object_or_404(Challenge, pk=pk, created_by=request.user)
     if request.method == "POST":
         form = ChallengeForm(request.POST, instance=challenge)
         if form.is_valid():
@@ -407,11 +562,11 @@ def challenge_edit(request, pk):
             return redirect('habit:challenge_detail', pk=challenge.pk)
     else:
         form = ChallengeForm(instance=challenge)
-    return render(request, 'habit/challenge_form.html', {'form': form})
+    return render(request, 'habit/challenges/challenge_form.html', {'form': form})
 
 @login_required
 def challenge_delete(request, pk):
-    challenge = get_object_or_404(Challenge, pk=pk, user=request.user)
+    challenge = get_object_or_404(Challenge, pk=pk, created_by=request.user)
     if request.method == "POST":
         challenge.delete()
         messages.success(request, "Challenge deleted successfully!")
@@ -468,12 +623,27 @@ def log_edit(request, pk):
     
     return render(request, "habit/logs/log_form.html", {"habit":log.habit,"today":today_date(),"form": form, "title": "Edit Log"})
 
+@login_required
 def log_list(request):
     """
-    Show all habit logs for the logged-in user.
+    Show the logged-in user's habit logs, one keyset page at a time.
     """
-    logs = HabitLog.objects.filter(habit__user=request.user).order_by('-date')
-    return render(request, 'habit/logs/log.html', {'logs': logs, "today":today_date()})
+    filter_form = HabitLogFilterForm(request.GET, user=request.user)
+    logs = filter_form.filter(
+        HabitLog.objects.filter(habit__user=request.user).select_related('habit', 'habit__unit')
+    )
+    page = keyset_page(logs, after=request.GET.get('after'), before=request.GET.get('before'))
+
+    # Keep the filters on the pagination links
+    query = request.GET.copy()
+    query.pop('after', None)
+    query.pop('before', None)
+    return render(request, 'habit/logs/log.html', {
+        'logs': page,
+        'filter_form': filter_form,
+        'filter_query': query.urlencode(),
+        "today": today_date(),
+    })
 
 
 def log_add(request, habit_id):
@@ -512,8 +682,185 @@ def log_add(request, habit_id):
 
     return render(request, "habit/logs/log_add.html", {"form": form, "habit": habit, "today": today_date()})
 
+LOG_GRID_DAYS = 7
+
+def _grid_entries(data):
+    """
+    Collect the filled ``p-<habit id>-<YYYY-MM-DD>`` cells of the log grid as
+    batch entries; blank cells are left alone.
+    """
+    entries = []
+    for name, value in data.items():
+        parts = name.split('-', 2)
+        if len(parts) != 3 or parts[0] != 'p' or not value.strip():
+            continue
+        try:
+            progress = int(value)
+        except ValueError:
+            progress = value  # Reported back by batchlog.validate()
+        habit_id = int(parts[1]) if parts[1].isdigit() else None
+        entries.append({'habit': habit_id, 'date': parts[2], 'progress': progress, 'cell': name})
+    return entries
+
+@login_required
+def log_grid(request):
+    """
+    Grid form for backfilling: one row per active habit, one column per day
+    of the week ending at ?end=, saved as a single batch.
+    """
+    today = today_date()
+    try:
+        end = min(datetime.date.fromisoformat(request.GET.get('end') or request.POST.get('end', '')), today)
+    except ValueError:
+        end = today
+    days = [end - datetime.timedelta(days=offset) for offset in range(LOG_GRID_DAYS - 1, -1, -1)]
+    habits = list(Habit.objects.filter(user=request.user, is_active=True).select_related('unit').order_by('created_at'))
+
+    values, cell_errors = {}, {}
+    if request.method == 'POST':
+        entries = _grid_entries(request.POST)
+        values = {entry['cell']: entry['progress'] for entry in entries}
+        if not entries:
+            messages.info(request, "Nothing to save.")
+        else:
+            try:
+                logs = batchlog.validate(request.user, entries, today)
+                result = batchlog.apply(request.user, logs)
+                messages.success(request, f"Saved {result['created'] + result['updated']} logs.")
+                return redirect(f"{reverse('habit:log_grid')}?end={end.isoformat()}")
+            except batchlog.BatchError as error:
+                for index, problems in error.errors.items():
+                    cell_errors[entries[index]['cell']] = ' '.join(problems.values())
+                messages.error(request, str(error))
+
+    stored = dict(
+        ((habit_id, day), progress) for habit_id, day, progress in
+        HabitLog.objects.filter(habit__in=habits, date__range=(days[0], days[-1])).values_list('habit_id', 'date', 'progress')
+    )
+    rows = []
+    for habit in habits:
+        cells = []
+        for day in days:
+            name = f"p-{habit.pk}-{day.isoformat()}"
+            cells.append({
+                'name': name,
+                'value': values.get(name, stored.get((habit.pk, day), '')),
+                'error': cell_errors.get(name),
+            })
+        rows.append({'habit': habit, 'cells': cells})
+
+    return render(request, 'habit/logs/log_grid.html', {
+        'days': days,
+        'rows': rows,
+        'end': end,
+        'previous_end': end - datetime.timedelta(days=LOG_GRID_DAYS),
+        'next_end': end + datetime.timedelta(days=LOG_GRID_DAYS) if end < today else None,
+    })
+
+@login_required
+def log_batch_api(request):
+    """
+    JSON batch logging: {"entries": [{"habit": id, "date": "YYYY-MM-DD",
+    "progress": n}, ...]}, validated and saved all or nothing.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'POST required'}, status=405)
+    try:
+        entries = json.loads(request.body).get('entries')
+    except (ValueError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Send a JSON object with an "entries" list.'}, status=400)
+    try:
+        logs = batchlog.validate(request.user, entries)
+    except batchlog.BatchError as error:
+        return JsonResponse({'success': False, 'error': str(error), 'errors': error.errors}, status=400)
+    return JsonResponse({'success': True, **batchlog.apply(request.user, logs)})
+
+@login_required
+def habit_complete(request, pk):
+    """
+    AJAX one-tap logging: add one unit of progress to today's log.
+    """
+    if request.method != "POST":
+        return JsonResponse({'success': False, 'error': 'POST required'}, status=405)
+    habit = get_object_or_404(Habit, pk=pk, user=request.user)
+    log = log_progress(habit)
+    # The streak engine catches up in the background; report where it lands
+    streak = Streak.objects.filter(habit=habit).order_by('pk').only('current_streak', 'last_completed').first()
+    return JsonResponse({
+        'success': True,
+        'progress': log.progress,
+        'target': habit.target_per_day,
+        'completed': log.completed,
+        'current_streak': projected(habit, streak, log.date) if log.completed else getattr(streak, 'current_streak', 0),
+    })
+
+# -----------------------------
+# LEADERBOARDS
+# -----------------------------
+def _leaderboard_json(entries, my_rank, my_score):
+    names = dict(User.objects.filter(id__in=[user_id for user_id, _ in entries]).values_list('id', 'username'))
+    return JsonResponse({
+        'top': [
+            {'rank': i, 'user_id': user_id, 'username': names.get(user_id), 'score': score}
+            for i, (user_id, score) in enumerate(entries, 1)
+        ],
+        'me': {'rank': my_rank, 'score': my_score},
+    })
+
+def _board_size(request):
+    n = request.GET.get('n', '')
+    return min(int(n), 100) if n.isdigit() and int(n) > 0 else 10
+
+@login_required
+def leaderboard_friends(request, metric):
+    if metric not in leaderboard.METRICS:
+        raise Http404("Unknown leaderboard")
+    size = _board_size(request)
+    entries = leaderboard.friends_top(request.user.pk, metric, size)
+    return _leaderboard_json(
+        entries,
+        leaderboard.friends_rank(request.user.pk, metric),
+        leaderboard.get_store().zscore(leaderboard.friends_key(request.user.pk, metric), request.user.pk),
+    )
+
+@login_required
+def leaderboard_challenge(request, pk):
+    challenge = get_object_or_404(
+        Challenge.objects.filter(Q(created_by=request.user) | Q(participants=request.user)).distinct(), pk=pk,
+    )
+    size = _board_size(request)
+    entries = leaderboard.challenge_top(challenge.pk, size)
+    return _leaderboard_json(
+        entries,
+        leaderboard.challenge_rank(challenge.pk, request.user.pk),
+        leaderboard.get_store().zscore(leaderboard.challenge_key(challenge.pk), request.user.pk),
+    )
+
 # Utility Functions
 
+HABIT_LOG_WINDOW_DAYS = 30
+
+def habit_log_window(habit, before, days=HABIT_LOG_WINDOW_DAYS):
+    """
+    Logs of ``habit`` dated before ``before``, newest first: the ``days``
+    days ending at the newest such log, so gaps in the history never give
+    an empty window. The completion percentage is computed in SQL. Also
+    returns the date to request the next window with, or None at the end.
+    """
+    newest = habit.logs.filter(date__lt=before).aggregate(newest=Max('date'))['newest']
+    if newest is None:
+        return [], None
+    start = newest - datetime.timedelta(days=days - 1)
+    logs = list(
+        habit.logs.filter(date__gte=start, date__lt=before)
+        .annotate(percentage=ExpressionWrapper(
+            F('progress') * Value(100.0) / Value(habit.target_per_day), output_field=FloatField()
+        ))
+        .order_by('-date')
+    )
+    has_older = habit.logs.filter(date__lt=start).exists()
+    return logs, (start if has_older else None)
+
 def today_date():
     return now().date()
 
@@ -49,10 +49,10 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
-                    this.classList.toggle('completed');
-                    this.innerHTML = this.classList.contains('completed') ? 
-                        '<i class="fas fa-check"></i> Completed' : 
-                        '<i class="fas fa-plus"></i> Mark Complete';
+                    this.classList.toggle('completed', data.completed);
+                    this.innerHTML = data.completed ?
+                        '<i class="fas fa-check"></i> Completed' :
+                        `<i class="fas fa-plus"></i> ${data.progress}/${data.target}`;
                 }
             });
         });
@@ -74,19 +74,39 @@ document.addEventListener('DOMContentLoaded', function() {
         return cookieValue;
     }
 
-    // Real-time notifications check
+    // Real-time notifications
+    const badge = document.querySelector('.notification-count');
+
+    function showUnread(count) {
+        if (count > 0) {
+            badge.textContent = count;
+            badge.style.display = 'flex';
+        } else {
+            badge.style.display = 'none';
+        }
+    }
+
     function checkNotifications() {
         fetch('/api/notifications/unread-count/')
             .then(response => response.json())
-            .then(data => {
-                const badge = document.querySelector('.notification-count');
-                if (badge && data.count > 0) {
-                    badge.textContent = data.count;
-                    badge.style.display = 'flex';
-                }
-            });
+            .then(data => showUnread(data.count));
     }
 
-    // Check notifications every 30 seconds
-    setInterval(checkNotifications, 30000);
+    if (badge) {
+        if (window.EventSource) {
+            // Pushed by the server; fall back to polling every 30 seconds
+            // only once the browser gives up on the stream
+            const stream = new EventSource('/api/notifications/stream/');
+            stream.addEventListener('unread', event => showUnread(JSON.parse(event.data).count));
+            stream.onerror = () => {
+                if (stream.readyState === EventSource.CLOSED) {
+                    checkNotifications();
+                    setInterval(checkNotifications, 30000);
+                }
+            };
+        } else {
+            // Check notifications every 30 seconds
+            setInterval(checkNotifications, 30000);
+        }
+    }
 });
\ No newline at end of file